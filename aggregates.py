@@ -0,0 +1,138 @@
+from datetime import date as date_type, datetime
+
+DATE_FORMAT = "%Y-%m-%d"
+TOTAL_METRICS = ('income', 'expense', 'bonus')
+
+
+def to_ordinal(day):
+    """Convert a 'YYYY-MM-DD' string or a date to its proleptic ordinal"""
+
+    if isinstance(day, (date_type, datetime)):
+        return day.toordinal()
+    return datetime.strptime(day, DATE_FORMAT).toordinal()
+
+
+class FenwickTree:
+    """Binary indexed tree of floats supporting point updates and prefix sums"""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0.0] * (size + 1)
+
+    def add(self, i, delta):
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        """Sum of positions 0..i inclusive"""
+        i = min(i, self.size - 1) + 1
+        total = 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, lo, hi):
+        lo = max(lo, 0)
+
+        if hi < lo or self.size == 0:
+            return 0.0
+        return self.prefix(hi) - (self.prefix(lo - 1) if lo > 0 else 0.0)
+
+
+class DailyAggregates:
+    """Per-day sums by type and category, queryable over any date range in O(log days)"""
+
+    def __init__(self, padding=366):
+        self.padding = padding
+        self.origin = 0
+        self.size = 0
+        self.daily = {}
+        self.trees = {}
+
+    @staticmethod
+    def amounts(source, trans):
+        """Yield (metric, value) pairs a transaction contributes to"""
+        amount = float(trans.get('amount') or 0)
+        yield source, amount
+        yield (source, trans.get('category')), amount
+
+        if source == 'income':
+            bonus = float(trans.get('bonus') or 0)
+
+            if bonus:
+                yield 'bonus', bonus
+
+    def build(self, datasets):
+        """Rebuild all sums from the {source: {date: [transactions]}} datasets"""
+        self.daily = {}
+        for source, data in datasets.items():
+            for day, transactions in data.items():
+                ordinal = to_ordinal(day)
+                for trans in transactions:
+                    for metric, value in self.amounts(source, trans):
+                        sums = self.daily.setdefault(ordinal, {})
+                        sums[metric] = sums.get(metric, 0.0) + value
+        self.rebuild_trees()
+
+    def rebuild_trees(self, include=None):
+        """Re-lay the Fenwick trees so every known day (and include) fits"""
+        ordinals = list(self.daily)
+
+        if include is not None:
+            ordinals.append(include)
+
+        if not ordinals:
+            self.origin, self.size, self.trees = 0, 0, {}
+            return
+        self.origin = min(ordinals) - self.padding
+        self.size = max(ordinals) - self.origin + self.padding + 1
+        self.trees = {}
+        for ordinal, sums in self.daily.items():
+            for metric, value in sums.items():
+                self.tree(metric).add(ordinal - self.origin, value)
+
+    def tree(self, metric):
+
+        if metric not in self.trees:
+            self.trees[metric] = FenwickTree(self.size)
+        return self.trees[metric]
+
+    def update(self, source, day, trans, sign=1):
+        """Apply a transaction's contribution (sign=-1 to retract it)"""
+        ordinal = to_ordinal(day)
+
+        if not self.origin <= ordinal < self.origin + self.size:
+            self.rebuild_trees(include=ordinal)
+        sums = self.daily.setdefault(ordinal, {})
+        for metric, value in self.amounts(source, trans):
+            sums[metric] = sums.get(metric, 0.0) + sign * value
+            self.tree(metric).add(ordinal - self.origin, sign * value)
+
+    def add(self, source, day, trans):
+        self.update(source, day, trans, 1)
+
+    def remove(self, source, day, trans):
+        self.update(source, day, trans, -1)
+
+    def metric_sum(self, metric, start, end):
+
+        if metric not in self.trees:
+            return 0.0
+        return self.trees[metric].range_sum(to_ordinal(start) - self.origin, to_ordinal(end) - self.origin)
+
+    def totals(self, start, end=None):
+        """Income, expense and bonus totals between start and end inclusive"""
+        end = end or start
+        return {metric: round(self.metric_sum(metric, start, end), 2) for metric in TOTAL_METRICS}
+
+    def category_totals(self, source, start, end=None):
+        """Per-category totals of one source between start and end inclusive"""
+        end = end or start
+        return {
+            metric[1]: round(self.metric_sum(metric, start, end), 2)
+            for metric in self.trees
+            if isinstance(metric, tuple) and metric[0] == source
+        }
@@ -0,0 +1,148 @@
+from datetime import date as date_type
+from aggregates import to_ordinal
+
+try:
+    import numpy as np
+
+except ImportError:
+    np = None
+
+EPOCH_ORDINAL = date_type(1970, 1, 1).toordinal()
+KINDS = {'expense': 0, 'income': 1}
+
+
+class AnalyticsUnavailable(Exception):
+    pass
+
+
+class TransactionArrays:
+    """Columnar NumPy copy of the ledger: date ordinal, amount, bonus, category code and type"""
+
+    def __init__(self, datasets):
+        ordinals, amounts, bonuses, categories, kinds = [], [], [], [], []
+        self.categories = []
+        codes = {}
+        for source, data in datasets.items():
+            kind = KINDS[source]
+            for day, transactions in data.items():
+
+                if not transactions:
+                    continue
+                ordinal = to_ordinal(day)
+                for trans in transactions:
+                    category = trans.get('category') or ""
+
+                    if category not in codes:
+                        codes[category] = len(self.categories)
+                        self.categories.append(category)
+                    ordinals.append(ordinal)
+                    amounts.append(float(trans.get('amount') or 0))
+                    bonuses.append(float(trans.get('bonus') or 0))
+                    categories.append(codes[category])
+                    kinds.append(kind)
+        self.ordinal = np.array(ordinals, dtype=np.int32)
+        self.amount = np.array(amounts, dtype=np.float64)
+        self.bonus = np.array(bonuses, dtype=np.float64)
+        self.category = np.array(categories, dtype=np.int32)
+        self.kind = np.array(kinds, dtype=np.int8)
+        days = (self.ordinal - EPOCH_ORDINAL).astype('datetime64[D]')
+        self.month = days.astype('datetime64[M]').astype(np.int32)
+
+    def mask(self, start, end, source=None):
+        selected = (self.ordinal >= to_ordinal(start)) & (self.ordinal <= to_ordinal(end))
+
+        if source is not None:
+            selected &= self.kind == KINDS[source]
+        return selected
+
+
+def month_label(month_number):
+    return str(np.datetime64(int(month_number), 'M'))
+
+
+class Analytics:
+    """Vectorized category and trend breakdowns, rebuilt only after the ledger changes"""
+
+    def __init__(self, ledger):
+
+        if np is None:
+            raise AnalyticsUnavailable("Analytics needs NumPy (pip install numpy)")
+        self.ledger = ledger
+        self.cached = None
+        self.cached_version = None
+
+    @property
+    def arrays(self):
+
+        if self.cached is None or self.cached_version != self.ledger.version:
+            self.cached = TransactionArrays(self.ledger.datasets)
+            self.cached_version = self.ledger.version
+        return self.cached
+
+    def month_range(self, start, end):
+        first = np.datetime64(start[:7], 'M').astype(np.int32)
+        last = np.datetime64(end[:7], 'M').astype(np.int32)
+        return first, last
+
+    def spend_by_category(self, start, end, source='expense'):
+        """Return (months, categories, totals[month, category]) for one type"""
+        arrays = self.arrays
+        selected = arrays.mask(start, end, source)
+        first, last = self.month_range(start, end)
+        n_months, n_categories = int(last - first + 1), len(arrays.categories)
+        cells = (arrays.month[selected] - first) * n_categories + arrays.category[selected]
+        totals = np.bincount(cells, weights=arrays.amount[selected], minlength=n_months * n_categories)
+        totals = totals.reshape(n_months, n_categories) if n_categories else totals.reshape(n_months, 0)
+        used = totals.any(axis=0)
+        months = [month_label(m) for m in range(first, last + 1)]
+        categories = [c for c, keep in zip(arrays.categories, used) if keep]
+        return months, categories, totals[:, used]
+
+    def daily_totals(self, start, end, source='expense'):
+        """Return (first ordinal, totals per day) for every day in the range"""
+        arrays = self.arrays
+        selected = arrays.mask(start, end, source)
+        first = to_ordinal(start)
+        n_days = to_ordinal(end) - first + 1
+        return first, np.bincount(arrays.ordinal[selected] - first, weights=arrays.amount[selected], minlength=n_days)
+
+    def rolling_average(self, start, end, window=30, source='expense'):
+        """Trailing window-day mean of daily totals, via a cumulative sum"""
+        first, daily = self.daily_totals(start, end, source)
+        cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+        index = np.arange(1, len(daily) + 1)
+        lower = np.maximum(index - window, 0)
+        averages = (cumulative[index] - cumulative[lower]) / np.minimum(index, window)
+        dates = [date_type.fromordinal(first + i).isoformat() for i in range(len(daily))]
+        return dates, averages
+
+    def monthly_totals(self, start, end):
+        """Per month income, expense, bonus and balance with month-over-month deltas"""
+        arrays = self.arrays
+        first, last = self.month_range(start, end)
+        n_months = int(last - first + 1)
+        selected = arrays.mask(start, end)
+        month = arrays.month[selected] - first
+        kind = arrays.kind[selected]
+        amount = arrays.amount[selected]
+        income = np.bincount(month[kind == 1], weights=amount[kind == 1], minlength=n_months)
+        expense = np.bincount(month[kind == 0], weights=amount[kind == 0], minlength=n_months)
+        bonus = np.bincount(month, weights=arrays.bonus[selected] * (kind == 1), minlength=n_months)
+        balance = income + bonus - expense
+        return {
+            'months': [month_label(m) for m in range(first, last + 1)],
+            'income': income,
+            'expense': expense,
+            'bonus': bonus,
+            'balance': balance,
+            'expense_delta': np.diff(expense, prepend=expense[:1]),
+            'income_delta': np.diff(income, prepend=income[:1])
+        }
+
+    def top_categories(self, start, end, count=5, source='expense'):
+        """Largest categories of one type in the range as [(category, total)]"""
+        arrays = self.arrays
+        selected = arrays.mask(start, end, source)
+        totals = np.bincount(arrays.category[selected], weights=arrays.amount[selected], minlength=len(arrays.categories))
+        order = np.argsort(totals)[::-1][:count]
+        return [(arrays.categories[i], float(totals[i])) for i in order if totals[i] > 0]
@@ -0,0 +1,246 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import date as date_type, datetime, timedelta
+from ledger import DATE_FORMAT, Ledger
+from storage import JsonStorage
+
+try:
+    import resource
+
+except ImportError:
+    resource = None
+
+EXPENSE_CATEGORIES = ('Food', 'Transport', 'Shopping', 'Entertainment', 'Bills', 'Other')
+INCOME_CATEGORIES = ('Salary', 'Freelance', 'Investment', 'Other')
+
+
+def generate_dataset(count, years=5, skew=1.0, income_share=0.15, seed=0):
+    """Build synthetic (expense, income) {date: [transactions]} dicts
+
+    Transactions are spread over the given number of years ending today.
+    Each day gets a random weight drawn from a Pareto distribution with
+    shape 1/skew, so a higher skew piles more transactions onto a few busy days;
+    skew 0 spreads them evenly.
+    """
+    rng = random.Random(seed)
+    last = date_type.today()
+    days = [(last - timedelta(days=n)).strftime(DATE_FORMAT) for n in range(years * 365)]
+    weights = [rng.paretovariate(1 / skew) for _ in days] if skew > 0 else None
+    expense, income = {}, {}
+    for day in rng.choices(days, weights=weights, k=count):
+        is_income = rng.random() < income_share
+        trans = {
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'time': f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+            'category': rng.choice(INCOME_CATEGORIES if is_income else EXPENSE_CATEGORIES),
+            'amount': round(rng.lognormvariate(6, 1.2), 2)
+        }
+
+        if is_income:
+            trans['bonus'] = round(rng.random() * 500, 2) if rng.random() < 0.1 else 0
+        (income if is_income else expense).setdefault(day, []).append(trans)
+    return expense, income
+
+
+def write_dataset(data_dir, expense, income):
+    """Save a dataset as expenses.json / income.json, the layout every backend migrates from"""
+    os.makedirs(data_dir, exist_ok=True)
+    storage = JsonStorage(data_dir)
+    storage.save('expense', expense)
+    storage.save('income', income)
+    storage.close()
+
+
+def percentiles(samples):
+    """Summary statistics in milliseconds"""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': round(pick(0.50), 3),
+        'p95_ms': round(pick(0.95), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(ordered[-1], 3)
+    }
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def random_range(rng, ledger_days, span):
+    start = datetime.strptime(rng.choice(ledger_days), DATE_FORMAT)
+    return start.strftime(DATE_FORMAT), (start + timedelta(days=span - 1)).strftime(DATE_FORMAT)
+
+
+def display_rows(ledger, start, end):
+    """The (sort_key, iid, values, tags) rows the history view builds in range mode"""
+    for source, date, trans in ledger.range_query(start, end):
+        values = (date, trans.get('time', ''), source.title(), trans.get('category', ''), f"{float(trans.get('amount') or 0):.2f}")
+        yield ((date, trans.get('time', '')), trans['id'], values, (source, trans['id'], date, 'range_mode'))
+
+
+def history_widget():
+    """A HistoryView on a withdrawn Tk root, or None when there is no display"""
+
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        from history_view import HistoryView
+        root = tk.Tk()
+
+    except Exception:
+        return None
+    root.withdraw()
+    tree = ttk.Treeview(root, columns=('Date', 'Time', 'Type', 'Category', 'Amount'), show='headings')
+    return root, HistoryView(tree, ttk.Scrollbar(root))
+
+
+def run_size(size, args, data_root):
+    """Benchmark one dataset size against the chosen backend; returns a result dict"""
+    rng = random.Random(args.seed)
+    data_dir = os.path.join(data_root, f"size-{size}")
+    expense, income = generate_dataset(size, args.years, args.skew, seed=args.seed)
+    ledger_days = sorted(set(expense) | set(income))
+    write_dataset(data_dir, expense, income)
+    del expense, income
+    gc.collect()
+    samples = {}
+    migrate_ms, ledger = timed(Ledger, data_dir, args.backend)
+    ledger.close()
+    for _ in range(args.load_repeat):
+        elapsed, ledger = timed(Ledger, data_dir, args.backend)
+        samples.setdefault('load', []).append(elapsed)
+        ledger.close()
+    tracemalloc.start()
+    ledger = Ledger(data_dir, args.backend)
+    peak_load = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    for _ in range(args.repeat):
+        start, end = random_range(rng, ledger_days, args.span)
+        samples.setdefault('range_query', []).append(timed(lambda: list(ledger.range_query(start, end)))[0])
+        samples.setdefault('totals', []).append(timed(ledger.totals, start, end)[0])
+        day = rng.choice(ledger_days)
+        elapsed, trans = timed(ledger.add, 'expense', 12.5, 'Food', day)
+        samples.setdefault('add', []).append(elapsed)
+        elapsed, _ = timed(ledger.delete, [(trans['id'], 'expense', day)])
+        samples.setdefault('delete', []).append(elapsed)
+        samples.setdefault('undo', []).append(timed(ledger.undo)[0])
+    for _ in range(max(1, args.repeat // 10)):
+        day = rng.choice(ledger_days)
+        ledger.datasets['expense'].setdefault(day, []).append({
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)), 'time': "12:00:00", 'category': 'Food', 'amount': 12.5
+        })
+        samples.setdefault('save', []).append(timed(ledger.save, 'expense')[0])
+    widget = history_widget()
+
+    if widget is not None:
+        root, history = widget
+        for _ in range(args.repeat):
+            start, end = random_range(rng, ledger_days, args.span)
+            samples.setdefault('display', []).append(timed(history.set_rows, display_rows(ledger, start, end))[0])
+        root.destroy()
+    ledger.close()
+    result = {
+        'size': size,
+        'backend': args.backend,
+        'migrate_ms': round(migrate_ms, 3),
+        'peak_load_mb': round(peak_load / 2 ** 20, 2),
+        'ops': {name: percentiles(values) for name, values in samples.items()}
+    }
+
+    if widget is None:
+        result['skipped'] = ['display (no Tk display available)']
+    return result
+
+
+def print_result(result, baseline=None):
+    print(f"\n{result['size']:,} transactions ({result['backend']}): "
+          f"peak load memory {result['peak_load_mb']} MB, first open {result['migrate_ms']:.1f} ms")
+    print(f"  {'operation':<12} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for name, stats in result['ops'].items():
+        line = (f"  {name:<12} {stats['count']:>6} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+                f"{stats['p99_ms']:>10.3f} {stats['max_ms']:>10.3f}")
+        old = (baseline or {}).get(name)
+
+        if old and old['p50_ms']:
+            line += f"  ({stats['p50_ms'] / old['p50_ms']:.2f}x p50 vs baseline)"
+        print(line)
+    for note in result.get('skipped', []):
+        print(f"  skipped: {note}")
+
+
+def load_baseline(path, backend):
+    """Map size -> ops from an earlier results file with the same backend"""
+
+    with open(path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)
+    return {r['size']: r['ops'] for r in previous['results'] if r['backend'] == backend}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the Finance Tracker data layer on synthetic datasets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="transactions per dataset")
+    parser.add_argument("--years", type=int, default=5, help="years of history to spread transactions over")
+    parser.add_argument("--skew", type=float, default=1.0, help="per-day concentration (0 = uniform)")
+    parser.add_argument("--backend", choices=("json", "sqlite", "columnar"), default="json")
+    parser.add_argument("--repeat", type=int, default=50, help="samples per operation")
+    parser.add_argument("--load-repeat", type=int, default=3, help="samples for the full load")
+    parser.add_argument("--span", type=int, default=31, help="days per range query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="", help="name for this run, e.g. a version or commit")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="earlier results JSON to compare p50 latencies against")
+    parser.add_argument("--keep-data", help="generate datasets here and keep them instead of a temp directory")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    baseline = load_baseline(args.compare, args.backend) if args.compare else {}
+    data_root = args.keep_data or tempfile.mkdtemp(prefix="finance-bench-")
+    results = []
+
+    try:
+        for size in args.sizes:
+            result = run_size(size, args, data_root)
+            print_result(result, baseline.get(size))
+            results.append(result)
+
+    finally:
+
+        if not args.keep_data:
+            shutil.rmtree(data_root, ignore_errors=True)
+    report = {
+        'label': args.label,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'keep_data')},
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        'results': results
+    }
+
+    if args.output:
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import argparse
+import sys
+from datetime import datetime
+from ledger import DATE_FORMAT, Ledger
+from importer import StatementError, import_statement
+from exporter import FORMATS, export
+from analytics import Analytics, AnalyticsUnavailable
+from recurring import FREQUENCIES, RuleError, describe
+from search import match_totals
+from perf import perf
+
+CATEGORIES = (
+    'Food', 'Transport', 'Shopping',
+    'Entertainment', 'Bills', 'Salary',
+    'Freelance', 'Investment', 'Other'
+)
+
+
+def parse_date(value):
+    """argparse type for YYYY-MM-DD dates"""
+
+    try:
+        datetime.strptime(value, DATE_FORMAT)
+
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+    return value
+
+
+def today():
+    return datetime.now().strftime(DATE_FORMAT)
+
+
+def cmd_add(ledger, args):
+    trans = ledger.add(args.type, args.amount, args.category, date=args.date, time=args.time, bonus=args.bonus)
+    print(f"Added {args.type} {trans['amount']:.2f} ({trans['category']}) on {args.date or today()} [{trans['id']}]")
+
+
+def print_transaction(source, date, trans):
+    bonus = f" +{float(trans.get('bonus') or 0):.2f}" if source == 'income' and trans.get('bonus') else ""
+    print(f"{date} {trans.get('time', ''):>8}  {source:<7}  {trans.get('category', ''):<13} "
+          f"{float(trans.get('amount') or 0):>12.2f}{bonus}  {trans['id']}")
+
+
+def cmd_list(ledger, args):
+    start, end = args.start or today(), args.end or args.start or today()
+    for source, date, trans in ledger.range_query(start, end):
+        print_transaction(source, date, trans)
+
+
+def cmd_search(ledger, args):
+
+    try:
+        matches = ledger.search(" ".join(args.query))
+
+    except ValueError as e:
+        print(f"Invalid search: {e}", file=sys.stderr)
+        return 1
+    for source, date, trans in matches[-args.limit:] if args.limit else matches:
+        print_transaction(source, date, trans)
+    totals = match_totals(matches)
+    print(f"{len(matches)} found: income {totals['income']:.2f}, expenses {totals['expense']:.2f}, bonus {totals['bonus']:.2f}")
+
+
+def cmd_report(ledger, args):
+    start, end = args.start or today(), args.end or args.start or today()
+    totals = ledger.totals(start, end)
+    print(f"Report {start} .. {end}")
+    print(f"  Total Income:   {totals['income']:>12.2f}")
+    print(f"  Total Expenses: {totals['expense']:>12.2f}")
+    print(f"  Total Bonus:    {totals['bonus']:>12.2f}")
+    print(f"  Balance:        {totals['income'] + totals['bonus'] - totals['expense']:>12.2f}")
+    for source in ('expense', 'income'):
+        categories = {c: v for c, v in ledger.category_totals(source, start, end).items() if v}
+
+        if categories:
+            print(f"  {source.title()} by category:")
+            for category, value in sorted(categories.items(), key=lambda item: -item[1]):
+                print(f"    {category or '-':<14} {value:>12.2f}")
+
+
+def cmd_import(ledger, args):
+
+    try:
+        added, skipped = import_statement(ledger, args.path, CATEGORIES, args.category, args.format)
+
+    except (StatementError, ValueError, OSError) as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Imported {len(added)} transactions, skipped {skipped} already present")
+    return 0
+
+
+def cmd_export(ledger, args):
+    start, end = args.start or today(), args.end or args.start or today()
+    written = export(ledger, args.path, args.format, start, end)
+    print(f"Wrote {written} lines to {args.path}")
+
+
+def cmd_analytics(ledger, args):
+    start, end = args.start or today(), args.end or args.start or today()
+
+    try:
+        analytics = Analytics(ledger)
+
+    except AnalyticsUnavailable as e:
+        print(e, file=sys.stderr)
+        return 1
+    monthly = analytics.monthly_totals(start, end)
+    dates, averages = analytics.rolling_average(start, end, window=args.window)
+    print(f"Analytics {start} .. {end}")
+    print(f"  {'Month':<8} {'Income':>12} {'Expense':>12} {'Change':>12} {'Balance':>12}")
+    for i, month in enumerate(monthly['months']):
+        print(f"  {month:<8} {monthly['income'][i]:>12.2f} {monthly['expense'][i]:>12.2f} "
+              f"{monthly['expense_delta'][i]:>+12.2f} {monthly['balance'][i]:>12.2f}")
+    print(f"  {args.window}-day average spend on {dates[-1]}: {averages[-1]:.2f}")
+    print("  Top categories:")
+    for category, total in analytics.top_categories(start, end, count=args.top):
+        print(f"    {category or '-':<14} {total:>12.2f}")
+
+
+def cmd_undo(ledger, args):
+    changes = ledger.redo() if args.command == "redo" else ledger.undo()
+
+    if not changes:
+        print(f"Nothing to {args.command}")
+        return 1
+    for change, source, date, trans in changes:
+        print(f"{change:<6} {date} {source:<7} {trans.get('category', ''):<13} {float(trans.get('amount') or 0):>12.2f}  {trans['id']}")
+
+
+def cmd_recurring(ledger, args):
+
+    if args.action == "add":
+
+        try:
+            rule = ledger.add_rule(
+                args.type, args.amount, args.category, args.every, args.start or today(),
+                interval=args.interval, end=args.end, time=args.time, bonus=args.bonus, note=args.note
+            )
+
+        except RuleError as e:
+            print(f"Invalid rule: {e}", file=sys.stderr)
+            return 1
+        print(f"Added rule {rule['id']}: {rule['source']} {rule['amount']:.2f} ({rule['category']}) {describe(rule)} from {rule['start']}")
+    elif args.action == "remove":
+
+        if not ledger.remove_rule(args.id):
+            print(f"No rule {args.id}", file=sys.stderr)
+            return 1
+        print(f"Removed rule {args.id}")
+    elif args.action == "run":
+        added = ledger.materialize_recurring(args.date)
+        print(f"Added {len(added)} recurring transactions")
+    else:
+        for rule in ledger.recurring.rules:
+            upcoming = ledger.recurring.next_occurrence(rule, today()) or "ended"
+            print(f"{rule['id']}  {rule['source']:<7} {rule['category']:<13} {rule['amount']:>12.2f}  "
+                  f"{describe(rule):<16} next {upcoming}")
+
+
+def cmd_forecast(ledger, args):
+    start, end = args.start or today(), args.end or args.start or today()
+    totals = ledger.forecast(start, end)
+    print(f"Projected {start} .. {end} (recorded plus recurring)")
+    print(f"  Total Income:   {totals['income']:>12.2f}")
+    print(f"  Total Expenses: {totals['expense']:>12.2f}")
+    print(f"  Total Bonus:    {totals['bonus']:>12.2f}")
+    print(f"  Balance:        {totals['income'] + totals['bonus'] - totals['expense']:>12.2f}")
+
+
+def add_range_arguments(command):
+    command.add_argument("--from", dest="start", type=parse_date, help="first date (default: today)")
+    command.add_argument("--to", dest="end", type=parse_date, help="last date (default: --from)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="finance-tracker", description="Finance Tracker without the GUI")
+    parser.add_argument("--data-dir", help="data directory (default: ~/.FinanceTracker)")
+    parser.add_argument("--backend", choices=("json", "sqlite", "columnar"), help="override the configured storage backend")
+    parser.add_argument("--timing", action="store_true", help="print per-operation timings to stderr when done")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a transaction")
+    add.add_argument("type", choices=("expense", "income"))
+    add.add_argument("amount", type=float)
+    add.add_argument("--category", default="Other", choices=CATEGORIES)
+    add.add_argument("--bonus", type=float, help="bonus amount (income only)")
+    add.add_argument("--date", type=parse_date, help="YYYY-MM-DD (default: today)")
+    add.add_argument("--time", help="time of day (default: now)")
+    add.set_defaults(func=cmd_add)
+
+    statement = commands.add_parser("import", help="import a CSV or OFX bank statement")
+    statement.add_argument("path")
+    statement.add_argument("--format", choices=("csv", "ofx"), help="default: from the file extension")
+    statement.add_argument("--category", default="Other", choices=CATEGORIES, help="category for rows without one")
+    statement.set_defaults(func=cmd_import)
+
+    exporter = commands.add_parser("export", help="export transactions or a monthly summary")
+    exporter.add_argument("path")
+    exporter.add_argument("--format", choices=FORMATS, default="csv")
+    exporter.set_defaults(func=cmd_export)
+    add_range_arguments(exporter)
+
+    analytics = commands.add_parser("analytics", help="monthly trends and top spending categories (needs NumPy)")
+    analytics.add_argument("--window", type=int, default=30, help="rolling average window in days")
+    analytics.add_argument("--top", type=int, default=5, help="number of top categories")
+    analytics.set_defaults(func=cmd_analytics)
+    add_range_arguments(analytics)
+
+    recurring = commands.add_parser("recurring", help="manage recurring transaction rules")
+    actions = recurring.add_subparsers(dest="action", required=True)
+    rule = actions.add_parser("add", help="add a rule")
+    rule.add_argument("type", choices=("expense", "income"))
+    rule.add_argument("amount", type=float)
+    rule.add_argument("--category", default="Other", choices=CATEGORIES)
+    rule.add_argument("--every", choices=FREQUENCIES, default="monthly", help="custom repeats every --interval days")
+    rule.add_argument("--interval", type=int, default=1, help="repeat every N days, weeks or months")
+    rule.add_argument("--start", type=parse_date, help="first occurrence (default: today)")
+    rule.add_argument("--end", type=parse_date, help="last possible occurrence")
+    rule.add_argument("--bonus", type=float, help="bonus amount (income only)")
+    rule.add_argument("--time", help="time of day (default: midnight)")
+    rule.add_argument("--note")
+    actions.add_parser("list", help="list rules and their next occurrence")
+    actions.add_parser("remove", help="remove a rule, keeping what it added").add_argument("id")
+    actions.add_parser("run", help="add every occurrence due so far").add_argument("--date", type=parse_date, help="treat this as today")
+    recurring.set_defaults(func=cmd_recurring)
+
+    forecast = commands.add_parser("forecast", help="projected totals including future recurring transactions")
+    forecast.set_defaults(func=cmd_forecast)
+    add_range_arguments(forecast)
+
+    search = commands.add_parser("search", help="search the whole history, e.g. food >500 last year dinner")
+    search.add_argument("query", nargs="+", help="type, category, amount (>N, <=N, N-M), from:/to:/year:/month: dates or note words")
+    search.add_argument("--limit", type=int, default=0, help="print only the latest N matches")
+    search.set_defaults(func=cmd_search)
+
+    for name in ("undo", "redo"):
+        commands.add_parser(name, help=f"{name} the last add, edit or delete").set_defaults(func=cmd_undo)
+
+    for name, func, help_text in (("list", cmd_list, "list transactions"), ("report", cmd_report, "print totals")):
+        command = commands.add_parser(name, help=help_text)
+        command.set_defaults(func=func)
+        add_range_arguments(command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    perf.enabled = perf.enabled or args.timing
+    ledger = Ledger(args.data_dir, backend=args.backend)
+
+    try:
+        return args.func(ledger, args) or 0
+
+    finally:
+        ledger.close()
+
+        if perf.enabled:
+            print(perf.report(), end="", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import json
+import math
+import os
+import struct
+import sys
+import uuid
+from array import array
+from collections.abc import MutableMapping
+
+MAGIC = b"FTM1"
+NONE_CODE = 0xFFFFFFFF
+MISSING_CODE = 0xFFFFFFFE
+ID_IN_EXTRAS = 1
+HAS_BONUS = 2
+AMOUNT_IS_INT = 4
+BONUS_IS_INT = 8
+AMOUNT_IN_EXTRAS = 16
+BASE_KEYS = ('id', 'time', 'category', 'amount', 'bonus')
+
+
+def pack_array(typecode, values):
+    column = array(typecode, values)
+
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def unpack_array(typecode, blob, offset, count):
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(blob[offset:offset + size])
+
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column, offset + size
+
+
+def encode_month(days):
+    """Encode one month of {date: [transactions]} as fixed-width little-endian columns
+
+    Layout: magic, row count, string table (JSON), then one column each for
+    day of month, flags, time code, category code, amount, bonus and the
+    16-byte id, followed by a JSON map of row -> fields that did not fit.
+    """
+    strings = []
+    string_codes = {}
+    day_col, flag_col, time_col, category_col, amount_col, bonus_col = [], [], [], [], [], []
+    ids = bytearray()
+    extras = {}
+
+    def code(trans, key):
+
+        if key not in trans:
+            return MISSING_CODE
+        value = trans[key]
+
+        if value is None:
+            return NONE_CODE
+
+        if value not in string_codes:
+            string_codes[value] = len(strings)
+            strings.append(value)
+        return string_codes[value]
+
+    for date in sorted(days):
+        for trans in days[date]:
+            row = len(day_col)
+            flags = 0
+            extra = {k: v for k, v in trans.items() if k not in BASE_KEYS}
+
+            try:
+                ids += uuid.UUID(trans['id']).bytes
+
+            except (ValueError, TypeError, AttributeError):
+                ids += bytes(16)
+                flags |= ID_IN_EXTRAS
+                extra['id'] = trans['id']
+            amount = trans.get('amount')
+
+            if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+                flags |= AMOUNT_IS_INT if isinstance(amount, int) else 0
+                amount_col.append(float(amount))
+            else:
+                flags |= AMOUNT_IN_EXTRAS
+                extra['amount'] = amount
+                amount_col.append(0.0)
+            bonus = trans.get('bonus')
+
+            if 'bonus' in trans and isinstance(bonus, (int, float)) and not isinstance(bonus, bool):
+                flags |= HAS_BONUS | (BONUS_IS_INT if isinstance(bonus, int) else 0)
+                bonus_col.append(float(bonus))
+            else:
+                bonus_col.append(math.nan)
+
+                if 'bonus' in trans:
+                    extra['bonus'] = bonus
+            day_col.append(int(date[8:10]))
+            flag_col.append(flags)
+            time_col.append(code(trans, 'time'))
+            category_col.append(code(trans, 'category'))
+
+            if extra:
+                extras[str(row)] = extra
+    strings_blob = json.dumps(strings).encode()
+    extras_blob = json.dumps(extras).encode()
+    return b"".join([
+        MAGIC,
+        struct.pack('<II', len(day_col), len(strings_blob)),
+        strings_blob,
+        pack_array('B', day_col),
+        pack_array('B', flag_col),
+        pack_array('I', time_col),
+        pack_array('I', category_col),
+        pack_array('d', amount_col),
+        pack_array('d', bonus_col),
+        bytes(ids),
+        struct.pack('<I', len(extras_blob)),
+        extras_blob
+    ])
+
+
+def decode_month(blob, month):
+    """Decode bytes produced by encode_month back into {date: [transactions]}"""
+
+    if blob[:4] != MAGIC:
+        raise ValueError(f"Not a month file for {month}")
+    count, strings_size = struct.unpack_from('<II', blob, 4)
+    offset = 12
+    strings = json.loads(blob[offset:offset + strings_size])
+    offset += strings_size
+    day_col, offset = unpack_array('B', blob, offset, count)
+    flag_col, offset = unpack_array('B', blob, offset, count)
+    time_col, offset = unpack_array('I', blob, offset, count)
+    category_col, offset = unpack_array('I', blob, offset, count)
+    amount_col, offset = unpack_array('d', blob, offset, count)
+    bonus_col, offset = unpack_array('d', blob, offset, count)
+    ids = blob[offset:offset + 16 * count]
+    offset += 16 * count
+    extras_size, = struct.unpack_from('<I', blob, offset)
+    extras = json.loads(blob[offset + 4:offset + 4 + extras_size])
+    days = {}
+    for row in range(count):
+        flags = flag_col[row]
+        amount = amount_col[row]
+        trans = {} if flags & ID_IN_EXTRAS else {'id': str(uuid.UUID(bytes=bytes(ids[16 * row:16 * row + 16])))}
+        for key, column in (('time', time_col), ('category', category_col)):
+
+            if column[row] != MISSING_CODE:
+                trans[key] = None if column[row] == NONE_CODE else strings[column[row]]
+        trans['amount'] = int(amount) if flags & AMOUNT_IS_INT else amount
+
+        if flags & HAS_BONUS:
+            bonus = bonus_col[row]
+            trans['bonus'] = int(bonus) if flags & BONUS_IS_INT else bonus
+        trans.update(extras.get(str(row), {}))
+
+        if 'id' in trans and trans['id'] is None:
+            del trans['id']
+        days.setdefault(f"{month}-{day_col[row]:02d}", []).append(trans)
+    return days
+
+
+def month_path(month_dir, source, month):
+    return os.path.join(month_dir, source, f"{month}.ftm")
+
+
+def read_month_file(month_dir, source, month):
+    """Read one source's month, or {} when the month has no file"""
+    path = month_path(month_dir, source, month)
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'rb') as f:
+        return decode_month(f.read(), month)
+
+
+def list_months(month_dir, source):
+    folder = os.path.join(month_dir, source)
+
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-4] for name in os.listdir(folder) if name.endswith(".ftm"))
+
+
+def months_between(start_date, end_date):
+    """Every 'YYYY-MM' from the month of start_date to that of end_date inclusive"""
+    year, month = int(start_date[:4]), int(start_date[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= end_date[:7]:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def split_months(data):
+    """Group a {date: [transactions]} dict into {month: {date: [transactions]}}"""
+    months = {}
+    for date, transactions in data.items():
+        months.setdefault(date[:7], {})[date] = transactions
+    return months
+
+
+class LazyMonthDict(MutableMapping):
+    """{date: [transactions]} view that reads a month file the first time one of its days is touched"""
+
+    def __init__(self, storage, source):
+        self.storage = storage
+        self.source = source
+        self.days = {}
+
+    def __getitem__(self, date):
+        self.storage.ensure_month(self.source, date[:7])
+        return self.days[date]
+
+    def __setitem__(self, date, transactions):
+        self.storage.ensure_month(self.source, date[:7])
+        self.days[date] = transactions
+
+    def __delitem__(self, date):
+        self.storage.ensure_month(self.source, date[:7])
+        del self.days[date]
+
+    def __contains__(self, date):
+        self.storage.ensure_month(self.source, str(date)[:7])
+        return date in self.days
+
+    def __iter__(self):
+        self.storage.ensure_all(self.source)
+        return iter(list(self.days))
+
+    def __len__(self):
+        self.storage.ensure_all(self.source)
+        return len(self.days)
+
+    def loaded_items(self):
+        """Days already in memory, without touching any more files"""
+        return list(self.days.items())
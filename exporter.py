@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import os
+from itertools import chain
+
+FIELDS = ('date', 'time', 'type', 'category', 'amount', 'bonus', 'note', 'id')
+SUMMARY_FIELDS = ('month', 'type', 'category', 'count', 'total', 'bonus')
+FORMATS = ('csv', 'jsonl', 'summary')
+
+
+def transaction_records(ledger, start, end):
+    """Yield one flat dict per transaction between start and end, in date order"""
+    for source, date, trans in ledger.range_query(start, end):
+        yield {
+            'date': date,
+            'time': trans.get('time'),
+            'type': 'Expense' if source == 'expense' else 'Income',
+            'category': trans.get('category'),
+            'amount': trans.get('amount'),
+            'bonus': trans.get('bonus'),
+            'note': trans.get('note'),
+            'id': trans.get('id')
+        }
+
+
+def csv_lines(records, fields=FIELDS):
+    """Format records as CSV text one line at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = (["" if record.get(f) is None else record.get(f) for f in fields] for record in records)
+    for row in chain([fields], rows):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def summary_records(records):
+    """Fold records into per-month, per-type, per-category counts and totals
+
+    Only the running groups are held in memory, never the transactions.
+    """
+    groups = {}
+    for record in records:
+        key = (record['date'][:7], record['type'], record['category'] or "")
+        group = groups.setdefault(key, [0, 0.0, 0.0])
+        group[0] += 1
+        group[1] += float(record['amount'] or 0)
+        group[2] += float(record['bonus'] or 0)
+    for (month, trans_type, category), (count, total, bonus) in sorted(groups.items()):
+        yield {
+            'month': month,
+            'type': trans_type,
+            'category': category,
+            'count': count,
+            'total': round(total, 2),
+            'bonus': round(bonus, 2)
+        }
+
+
+def export_lines(ledger, fmt, start, end):
+    """Generator pipeline: ledger range -> records -> formatted text lines"""
+    records = transaction_records(ledger, start, end)
+
+    if fmt == 'jsonl':
+        return jsonl_lines(records)
+
+    if fmt == 'summary':
+        return csv_lines(summary_records(records), SUMMARY_FIELDS)
+    return csv_lines(records)
+
+
+def export_steps(lines, path, chunk=2000):
+    """Write lines to path in chunks, yielding the running line count after each one
+
+    Writes go to a temporary file that replaces path only once the export
+    is complete, so an interrupted export never leaves a partial file.
+    """
+    temp_file = path + ".part"
+    written = 0
+
+    try:
+
+        with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+            batch = []
+            for line in lines:
+                batch.append(line)
+
+                if len(batch) >= chunk:
+                    f.writelines(batch)
+                    written += len(batch)
+                    batch = []
+                    yield written
+            f.writelines(batch)
+            written += len(batch)
+        os.replace(temp_file, path)
+        yield written
+
+    finally:
+
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def export(ledger, path, fmt, start, end):
+    """Run a whole export synchronously; returns the number of lines written"""
+    written = 0
+    for written in export_steps(export_lines(ledger, fmt, start, end), path):
+        pass
+    return written
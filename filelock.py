@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+
+except ImportError:
+    msvcrt = None
+
+
+def file_signature(path):
+    """(inode, mtime_ns, size) of a file, or None when it does not exist
+
+    Two equal signatures mean the file has not been rewritten or appended to
+    in between, so comparing them replaces re-reading the file.
+    """
+
+    try:
+        st = os.stat(path)
+
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class DataLock:
+    """Advisory lock on a file in the data directory, shared by every Finance Tracker process
+
+    Held exclusively around journal appends, snapshot writes and the reads
+    that check for changes, so one process never reads another's half-done
+    write. Re-entrant, and also excludes other threads of the same process.
+    Uses flock on Unix and msvcrt.locking on Windows; where neither exists it
+    only excludes threads.
+    """
+
+    def __init__(self, path, poll=0.05):
+        self.path = path
+        self.poll = poll
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.handle = None
+
+    def acquire(self):
+        self.thread_lock.acquire()
+
+        if self.depth == 0:
+
+            try:
+                self.handle = open(self.path, 'a+b')
+                self.lock_file()
+
+            except BaseException:
+
+                if self.handle is not None:
+                    self.handle.close()
+                    self.handle = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+
+    def lock_file(self):
+
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            self.handle.seek(0)
+            while True:
+
+                try:
+                    msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+                    return
+
+                except OSError:
+                    time.sleep(self.poll)
+
+    def unlock_file(self):
+
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def release(self):
+        self.depth -= 1
+
+        if self.depth == 0:
+
+            try:
+                self.unlock_file()
+
+            finally:
+                self.handle.close()
+                self.handle = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+
+class HistoryView:
+    """Paged Treeview model: holds every row but only materializes what has been scrolled into view"""
+
+    def __init__(self, tree, scrollbar, page_size=200, threshold=0.9):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.page_size = page_size
+        self.threshold = threshold
+        self.keys = []
+        self.rows = []
+        self.row_keys = {}
+        self.materialized = 0
+        self.pending = None
+        self.loading = False
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+
+    def set_rows(self, rows):
+        """Replace all rows; rows is an iterable of (sort_key, iid, values, tags)"""
+        rows = sorted(rows, key=lambda row: row[0])
+        self.keys = [row[0] for row in rows]
+        self.rows = rows
+        self.row_keys = {row[1]: row[0] for row in rows}
+        self.pending = None
+        self.tree.delete(*self.tree.get_children())
+        self.materialized = 0
+        self.load_more()
+
+    def stream_rows(self, rows):
+        """Replace all rows with an iterable already in sort order, drawing from it a page at a time
+
+        Rows are only built as they are scrolled into view, so a result set
+        of any size shows its first page at once.
+        """
+        self.keys, self.rows, self.row_keys = [], [], {}
+        self.pending = iter(rows)
+        self.tree.delete(*self.tree.get_children())
+        self.materialized = 0
+        self.load_more()
+
+    def pull(self, target):
+        """Take rows from the stream until target rows are held or it runs out"""
+        for row in islice(self.pending, max(0, target - len(self.rows))):
+            self.keys.append(row[0])
+            self.rows.append(row)
+            self.row_keys[row[1]] = row[0]
+
+        if len(self.rows) < target:
+            self.pending = None
+
+    def load_more(self):
+        """Materialize the next page of rows"""
+
+        if self.pending is not None:
+            self.pull(self.materialized + self.page_size)
+        end = min(self.materialized + self.page_size, len(self.rows))
+        for key, iid, values, tags in self.rows[self.materialized:end]:
+            self.tree.insert('', 'end', iid=iid, values=values, tags=tags)
+        self.materialized = end
+        self.loading = False
+
+    def on_tree_scroll(self, first, last):
+        """Forward scroll position to the scrollbar and page in rows near the bottom"""
+        self.scrollbar.set(first, last)
+        more = self.pending is not None or self.materialized < len(self.rows)
+
+        if not self.loading and more and float(last) >= self.threshold:
+            self.loading = True
+            self.tree.after_idle(self.load_more)
+
+    def position(self, iid):
+        """Index of a row in the full list, or None if it is not shown"""
+        key = self.row_keys.get(iid)
+
+        if key is None:
+            return None
+        for i in range(bisect_left(self.keys, key), bisect_right(self.keys, key)):
+
+            if self.rows[i][1] == iid:
+                return i
+        return None
+
+    def insert_row(self, row):
+        """Insert a single row in sort order without rebuilding the view"""
+        key, iid, values, tags = row
+
+        if iid in self.row_keys:
+            self.remove_rows([iid])
+
+        if self.pending is not None and (not self.keys or key > self.keys[-1]):
+            return
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.rows.insert(i, row)
+        self.row_keys[iid] = key
+
+        if i < self.materialized or self.materialized == len(self.rows) - 1:
+            self.tree.insert('', i, iid=iid, values=values, tags=tags)
+            self.materialized += 1
+
+    def remove_rows(self, iids):
+        """Remove rows by id; returns how many were found"""
+        removed = 0
+        for iid in iids:
+            i = self.position(iid)
+
+            if i is None:
+                continue
+            del self.keys[i]
+            del self.rows[i]
+            del self.row_keys[iid]
+
+            if i < self.materialized:
+                self.materialized -= 1
+
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self.rows)
+
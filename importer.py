@@ -0,0 +1,179 @@
+import csv
+import hashlib
+import os
+import re
+from datetime import datetime
+from ledger import DATE_FORMAT
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%m/%d/%Y", "%d %b %Y", "%d-%b-%Y", "%Y%m%d")
+HEADER_ALIASES = {
+    'date': ('date', 'transaction date', 'txn date', 'value date', 'posting date', 'posted date'),
+    'time': ('time', 'transaction time'),
+    'amount': ('amount', 'transaction amount', 'amt'),
+    'debit': ('debit', 'withdrawal', 'withdrawal amt.', 'withdrawal amount', 'dr'),
+    'credit': ('credit', 'deposit', 'deposit amt.', 'deposit amount', 'cr'),
+    'type': ('type', 'transaction type', 'dr/cr'),
+    'category': ('category',),
+    'bonus': ('bonus',),
+    'note': ('description', 'narration', 'details', 'memo', 'remarks', 'particulars', 'note', 'name')
+}
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+class StatementError(Exception):
+    pass
+
+
+def parse_date(value):
+    """Parse a statement date in any of the common layouts into YYYY-MM-DD"""
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+
+        try:
+            return datetime.strptime(value, fmt).strftime(DATE_FORMAT)
+
+        except ValueError:
+            continue
+    raise StatementError(f"Unrecognised date: {value!r}")
+
+
+def parse_amount(value):
+    """Parse '1,234.50', '(12.00)' or '₹ 99' into a float; blank is None"""
+    value = (value or "").strip().replace(",", "").replace("₹", "").replace(" ", "")
+
+    if not value:
+        return None
+    negative = value.startswith("(") and value.endswith(")")
+    amount = float(value.strip("()"))
+    return -amount if negative else amount
+
+
+def map_columns(fieldnames):
+    """Match CSV headers to schema fields by common bank-statement names"""
+    lookup = {name.strip().lower(): name for name in fieldnames if name}
+    mapping = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+
+            if alias in lookup:
+                mapping[field] = lookup[alias]
+                break
+
+    if 'date' not in mapping or not ({'amount', 'debit', 'credit'} & set(mapping)):
+        raise StatementError("CSV needs a date column and an amount or debit/credit column")
+    return mapping
+
+
+def csv_rows(path, categories, default_category="Other"):
+    """Stream (source, date, fields) from a CSV statement one row at a time"""
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        mapping = map_columns(reader.fieldnames or [])
+        for row in reader:
+            value = lambda field: row.get(mapping[field], "") if field in mapping else ""
+
+            if not value('date').strip():
+                continue
+            debit, credit = parse_amount(value('debit')), parse_amount(value('credit'))
+
+            if debit or credit:
+                source, amount = ('expense', debit) if debit else ('income', credit)
+            else:
+                amount = parse_amount(value('amount'))
+
+                if amount is None:
+                    continue
+                kind = value('type').strip().lower()
+
+                if kind in ('expense', 'debit', 'dr', 'd'):
+                    source = 'expense'
+                elif kind in ('income', 'credit', 'cr', 'c'):
+                    source = 'income'
+                else:
+                    source = 'expense' if amount < 0 else 'income'
+            category = value('category').strip()
+            yield source, parse_date(value('date')), {
+                'time': value('time').strip() or None,
+                'category': category if category in categories else default_category,
+                'amount': abs(amount),
+                'bonus': parse_amount(value('bonus')) if source == 'income' else None,
+                'note': value('note').strip() or None
+            }
+
+
+def ofx_rows(path, default_category="Other"):
+    """Stream (source, date, fields) from the <STMTTRN> blocks of an OFX/QFX file"""
+    current = None
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            upper = line.upper()
+
+            if "<STMTTRN>" in upper:
+                current = {}
+
+            if current is not None:
+                for tag, text in OFX_FIELD.findall(line):
+                    current[tag.upper()] = text.strip()
+
+            if "</STMTTRN>" in upper and current is not None:
+                amount = parse_amount(current.get('TRNAMT'))
+
+                if amount is not None and current.get('DTPOSTED'):
+                    yield ('expense' if amount < 0 else 'income'), parse_date(current['DTPOSTED'][:8]), {
+                        'time': None,
+                        'category': default_category,
+                        'amount': abs(amount),
+                        'bonus': None,
+                        'note': current.get('MEMO') or current.get('NAME')
+                    }
+                current = None
+
+
+def statement_rows(path, categories, default_category="Other", file_format=None):
+    """Pick the CSV or OFX reader from the format or file extension"""
+    file_format = file_format or ('ofx' if os.path.splitext(path)[1].lower() in ('.ofx', '.qfx') else 'csv')
+
+    if file_format == 'ofx':
+        return ofx_rows(path, default_category)
+    return csv_rows(path, categories, default_category)
+
+
+def content_hash(source, date, amount):
+    """Identity of a transaction for dedup: what a statement and a manual entry have in common"""
+    return hashlib.sha1(f"{source}|{date}|{round(float(amount or 0), 2):.2f}".encode()).hexdigest()
+
+
+def dedup(ledger, rows):
+    """Drop rows already present in the ledger, counting repeats so genuine same-day duplicates survive"""
+    existing = {}
+    for source, date, fields in rows:
+        key = (source, date)
+
+        if key not in existing:
+            counts = {}
+            for trans in ledger.datasets[source].get(date, []):
+                digest = content_hash(source, date, trans.get('amount'))
+                counts[digest] = counts.get(digest, 0) + 1
+            existing[key] = counts
+        digest = content_hash(source, date, fields['amount'])
+
+        if existing[key].get(digest, 0) > 0:
+            existing[key][digest] -= 1
+            continue
+        yield source, date, fields
+
+
+def import_statement(ledger, path, categories, default_category="Other", file_format=None):
+    """Stream, dedup and add a statement with one batched write; returns (added, skipped)"""
+    parsed = 0
+
+    def counted(rows):
+        nonlocal parsed
+        for row in rows:
+            parsed += 1
+            yield row
+
+    added = ledger.add_many(dedup(ledger, counted(statement_rows(path, categories, default_category, file_format))))
+    return added, parsed - len(added)
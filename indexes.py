@@ -0,0 +1,60 @@
+from transaction import compact_id, id_key
+
+
+class TransactionIndex:
+    """In-memory map of transaction id -> (source, date, position)
+
+    UUID ids are keyed by their 128-bit int so the index holds no id strings.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def build(self, datasets):
+        """Index every transaction of every source"""
+        self.entries = {}
+        for source, data in datasets.items():
+            for date, transactions in data.items():
+                self.index_day(source, date, transactions)
+
+    def index_day(self, source, date, transactions):
+        """Refresh positions for one day after it has been reordered"""
+        for position, trans in enumerate(transactions):
+            self.entries[id_key(trans)] = (source, date, position)
+
+    def add(self, trans_id, source, date, position):
+        self.entries[compact_id(trans_id)] = (source, date, position)
+
+    def remove(self, trans_id):
+        self.entries.pop(compact_id(trans_id), None)
+
+    def get(self, trans_id):
+        return self.entries.get(compact_id(trans_id))
+
+    def locate(self, datasets, trans_id, source=None, date=None):
+        """Return (source, date, position) for an id, re-indexing the hinted day if the entry is stale"""
+        key = compact_id(trans_id)
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            entry_source, entry_date, position = entry
+            day = datasets[entry_source].get(entry_date, [])
+
+            if position < len(day) and id_key(day[position]) == key:
+                return entry
+            source, date = source or entry_source, date or entry_date
+
+        if source is None or date not in datasets[source]:
+            return None
+        self.index_day(source, date, datasets[source][date])
+        entry = self.entries.get(key)
+
+        if entry is None or entry[:2] != (source, date):
+            return None
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, trans_id):
+        return compact_id(trans_id) in self.entries
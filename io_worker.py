@@ -0,0 +1,99 @@
+import queue
+import threading
+
+
+class IOWorker:
+    """Single writer thread with a coalescing job queue
+
+    Jobs submitted under the same key replace each other while still queued,
+    so a burst of saves collapses into one write. Results and errors are
+    handed back through dispatch(), which the Tk main loop polls via after().
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.condition = threading.Condition()
+        self.results = queue.Queue()
+        self.busy = False
+        self.running = True
+        self.counter = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, func, *args, callback=None):
+        """Queue func(*args); a pending job with the same key is replaced"""
+
+        with self.condition:
+
+            if key is None:
+                self.counter += 1
+                key = ('job', self.counter)
+            self.jobs.pop(key, None)
+            self.jobs[key] = (func, args, callback)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+
+            with self.condition:
+                while not self.jobs and self.running:
+                    self.condition.wait()
+
+                if not self.jobs:
+                    return
+                key = next(iter(self.jobs))
+                func, args, callback = self.jobs.pop(key)
+                self.busy = True
+            result, error = None, None
+
+            try:
+                result = func(*args)
+
+            except Exception as e:
+                error = e
+
+            if callback is not None or error is not None:
+                self.results.put((callback, result, error))
+
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    def dispatch(self, on_error=None):
+        """Run callbacks of finished jobs; call from the Tk main loop"""
+        while True:
+
+            try:
+                callback, result, error = self.results.get_nowait()
+
+            except queue.Empty:
+                return
+
+            if error is not None:
+
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    print("I/O error:", error)
+            elif callback is not None:
+                callback(result)
+
+    def pending(self):
+
+        with self.condition:
+            return len(self.jobs) + (1 if self.busy else 0)
+
+    def flush(self, timeout=None):
+        """Block until every queued job has been written"""
+
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.jobs and not self.busy, timeout)
+
+    def stop(self):
+        """Flush outstanding jobs and stop the thread"""
+        self.flush()
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
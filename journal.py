@@ -0,0 +1,291 @@
+import json
+import os
+import shutil
+import threading
+from contextlib import nullcontext
+from filelock import file_signature
+from perf import perf
+
+TAIL_BYTES = 64
+
+
+class TransactionJournal:
+    """Append-only log of transaction mutations, compacted into the JSON snapshots
+
+    Several processes may append to the same journal under lock. offset is
+    how far this process has read; anything past it was written by another
+    process and is collected into foreign for the owner to merge. While the
+    file's signature is unchanged nothing needs reading. When the file is
+    rotated or replaced underneath (a different inode, or the bytes before
+    offset no longer match tail, since inode numbers get reused), replaced
+    is set instead and only a full reload is safe.
+    """
+
+    def __init__(self, path, compact_threshold=500, lock=None):
+        self.path = path
+        self.compacting_path = path + ".compacting"
+        self.compact_threshold = compact_threshold
+        self.lock = lock or nullcontext()
+        self.pending = 0
+        self.compaction_thread = None
+        self.signature = None
+        self.offset = 0
+        self.tail = b""
+        self.foreign = []
+        self.replaced = False
+        self.collected = 0
+
+    def append(self, op, source, date, trans, index=None):
+        """Write one add/delete/edit record keyed by transaction id"""
+        self.append_many([(op, source, date, trans, index)])
+
+    def append_many(self, records):
+        """Write a batch of (op, source, date, trans, index) records with a single fsync"""
+        lines = []
+        for op, source, date, trans, index in records:
+            record = {"op": op, "source": source, "date": date, "id": trans['id']}
+
+            if op != "delete":
+                record["trans"] = trans
+
+            if index is not None:
+                record["index"] = index
+            lines.append(json.dumps(record) + "\n")
+
+        with self.lock:
+            self.collect()
+
+            with perf.measure('journal_append'), open(self.path, 'a') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+                st = os.fstat(f.fileno())
+            self.signature, self.offset = (st.st_ino, st.st_mtime_ns, st.st_size), st.st_size
+            self.tail = (self.tail + "".join(lines).encode())[-TAIL_BYTES:]
+        perf.add_bytes('journal_append', sum(map(len, lines)))
+        self.pending += len(lines)
+
+    def read_records(self, path):
+        """Yield records from a journal file, skipping a torn final line"""
+
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'r') as f:
+            yield from self.parse(f)
+
+    @staticmethod
+    def parse(lines):
+        for line in lines:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                yield json.loads(line)
+
+            except json.JSONDecodeError:
+                continue
+
+    def records(self):
+        """Every record in the compacting and live journals, oldest first"""
+        return [record for path in (self.compacting_path, self.path) for record in self.read_records(path)]
+
+    def all_records(self):
+        """records(), marking them all as read"""
+
+        with self.lock:
+            records = self.records()
+            self.mark_read()
+        self.pending = len(records)
+        return records
+
+    def replay(self, expense_data, income_data):
+        """Apply journaled mutations on top of freshly loaded snapshots"""
+        return self.replay_into({'expense': expense_data, 'income': income_data})
+
+    def replay_into(self, datasets):
+        """Apply every journaled mutation to a {source: data} dict; sources not in it are skipped"""
+        for record in self.all_records():
+            self.apply(record, datasets)
+        return self.pending
+
+    def mark_read(self):
+        """Treat everything currently in the live journal as seen"""
+        self.signature, self.offset, self.tail = None, 0, b""
+
+        try:
+
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                self.signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+                self.offset = f.seek(0, os.SEEK_END)
+                f.seek(max(0, self.offset - TAIL_BYTES))
+                self.tail = f.read(self.offset)
+
+        except OSError:
+            pass
+
+    def read_new(self):
+        """Complete records appended since offset, or None if the journal was rotated or replaced"""
+        signature = file_signature(self.path)
+
+        if signature == self.signature:
+            return []
+
+        if signature is None or self.signature is not None and signature[0] != self.signature[0]:
+            return None
+        size = signature[2]
+
+        if size < self.offset:
+            return None
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset - len(self.tail))
+
+            if f.read(len(self.tail)) != self.tail:
+                return None
+            chunk = f.read(size - self.offset)
+        chunk = chunk[:chunk.rfind(b"\n") + 1]
+        self.signature = signature
+        self.offset += len(chunk)
+        self.tail = (self.tail + chunk)[-TAIL_BYTES:]
+        return list(self.parse(chunk.splitlines()))
+
+    def collect(self):
+        """Set aside records other processes appended; call with the lock held"""
+        records = self.read_new()
+
+        if records is None:
+            self.replaced = True
+            self.collected += 1
+        elif records:
+            self.foreign.extend(records)
+            self.collected += len(records)
+
+    def take_changes(self):
+        """(records, replaced) from other processes since the last call"""
+
+        with self.lock:
+            self.collect()
+            records, replaced = self.foreign, self.replaced
+            self.foreign, self.replaced = [], False
+        return records, replaced
+
+    def checkpoint(self):
+        """Token for the journal state memory reflects, or None while changes from elsewhere are unmerged"""
+
+        with self.lock:
+            return None if self.foreign or self.replaced else self.collected
+
+    @staticmethod
+    def apply(record, datasets):
+        """Apply a single record; replaying the same record twice is harmless"""
+        data = datasets.get(record.get("source"))
+
+        if data is None:
+            return
+        date = record["date"]
+        trans_id = record["id"]
+        day = data.setdefault(date, []) if record["op"] == "add" else data.get(date, [])
+        position = next((i for i, t in enumerate(day) if t.get('id') == trans_id), None)
+
+        if record["op"] == "add":
+
+            if position is not None:
+                return
+            trans = dict(record["trans"])
+            index = record.get("index")
+
+            if index is not None and index <= len(day):
+                day.insert(index, trans)
+            else:
+                day.append(trans)
+        elif record["op"] == "delete":
+
+            if position is not None:
+                day.pop(position)
+        elif record["op"] == "edit":
+
+            if position is not None:
+                day[position].clear()
+                day[position].update(record["trans"])
+
+    def clear(self):
+        """Delete the live and compacting journals once a snapshot holds everything in them"""
+        self.wait()
+
+        with self.lock:
+            for path in (self.compacting_path, self.path):
+
+                if os.path.exists(path):
+                    os.remove(path)
+            self.signature, self.offset, self.tail = None, 0, b""
+        self.pending = 0
+
+    def needs_compaction(self):
+        return self.pending >= self.compact_threshold and not self.is_compacting()
+
+    def is_compacting(self):
+        return self.compaction_thread is not None and self.compaction_thread.is_alive()
+
+    def rotate(self):
+        """Move the live journal aside so new records go to a fresh file"""
+
+        if not os.path.exists(self.path):
+            return
+
+        if os.path.exists(self.compacting_path):
+
+            with open(self.path, 'r') as src, open(self.compacting_path, 'a') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.compacting_path)
+
+    def compact(self, snapshots, writer, checkpoint):
+        """Write snapshots in the background, then drop the records they cover
+
+        snapshots is a list of (data, filename) pairs already detached from the
+        live dicts; writer(data, filename) performs the actual file write.
+        checkpoint comes from checkpoint() when the snapshots were taken; if
+        another process has appended since, the snapshots would miss its
+        records, so compaction is skipped until they have been merged.
+        """
+
+        if self.is_compacting():
+            return False
+
+        with self.lock:
+            self.collect()
+
+            if checkpoint is None or checkpoint != self.collected:
+                return False
+            self.rotate()
+            self.signature, self.offset, self.tail = None, 0, b""
+        self.pending = 0
+
+        def run():
+
+            try:
+
+                with self.lock:
+                    for data, filename in snapshots:
+                        writer(data, filename)
+
+                    if os.path.exists(self.compacting_path):
+                        os.remove(self.compacting_path)
+
+            except Exception as e:
+                print("Journal compaction error:", e)
+
+        self.compaction_thread = threading.Thread(target=run, daemon=True)
+        self.compaction_thread.start()
+        return True
+
+    def wait(self):
+        """Block until a running compaction has finished"""
+
+        if self.is_compacting():
+            self.compaction_thread.join()
@@ -0,0 +1,705 @@
+import configparser
+import os
+import uuid
+from datetime import datetime, timedelta
+from storage import SOURCES, assign_missing_ids, open_storage
+from journal import TransactionJournal
+from indexes import TransactionIndex
+from aggregates import DailyAggregates
+from undo_log import UndoLog
+from recurring import RecurringRules, occurrence_id
+from perf import perf
+from search import SearchIndex, parse_query
+from transaction import Transaction, as_dict, compact_days, id_key
+
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M:%S"
+
+
+def default_data_dir():
+    return os.path.join(os.path.expanduser("~"), ".FinanceTracker")
+
+
+def read_setting(data_dir, section, option, fallback):
+    """Read one option from config.ini, or fallback when it is not set"""
+    config_file = os.path.join(data_dir, "config.ini")
+
+    if os.path.exists(config_file):
+        config = configparser.ConfigParser()
+        config.read(config_file)
+
+        if section in config:
+            return config[section].get(option, fallback)
+    return fallback
+
+
+def configured_backend(data_dir):
+    """Load storage backend name (json, sqlite or columnar) from config.ini"""
+    return read_setting(data_dir, "Storage", "backend", "json")
+
+
+def configured_undo_depth(data_dir):
+    """Number of undo steps to keep, from [Undo] depth in config.ini"""
+
+    try:
+        return max(1, int(read_setting(data_dir, "Undo", "depth", 100)))
+
+    except ValueError:
+        return 100
+
+
+def configured_undo_bytes(data_dir):
+    """Most bytes of undo history to keep, from [Undo] max_mb in config.ini"""
+
+    try:
+        return int(max(0.1, float(read_setting(data_dir, "Undo", "max_mb", 4))) * 1024 * 1024)
+
+    except ValueError:
+        return 4 * 1024 * 1024
+
+
+def source_of(trans_type):
+    """Map the UI's 'Expense'/'Income' labels to storage source names"""
+    return 'expense' if trans_type.lower() == 'expense' else 'income'
+
+
+def dates_between(start, end):
+    """Every 'YYYY-MM-DD' from start to end inclusive"""
+    first = datetime.strptime(start, DATE_FORMAT)
+    days = (datetime.strptime(end, DATE_FORMAT) - first).days + 1
+    return [(first + timedelta(days=n)).strftime(DATE_FORMAT) for n in range(days)]
+
+
+def run_now(key, func, *args, callback=None):
+    """Default writer: perform storage I/O synchronously"""
+    result = func(*args)
+
+    if callback is not None:
+        callback(result)
+
+
+class Ledger:
+    """Transaction data model with no GUI dependencies
+
+    Holds the expense/income {date: [transactions]} dicts together with the
+    id index and aggregate cache, and routes every mutation to storage
+    through writer(key, func, *args) - synchronous by default, the GUI's
+    IOWorker.submit when running under Tk, with flush() waiting for it to
+    drain. version increases on every in-memory change so derived caches
+    know when to rebuild.
+    """
+
+    def __init__(self, data_dir=None, backend=None, writer=None, flush=None):
+        self.data_dir = data_dir or default_data_dir()
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        if read_setting(self.data_dir, "Diagnostics", "timing", "false").lower() in ("1", "true", "yes", "on"):
+            perf.enabled = True
+        self.writer = writer or run_now
+        self.flush = flush
+
+        with perf.measure('load_data'):
+            self.storage = open_storage(self.data_dir, backend or configured_backend(self.data_dir))
+            self.expense_data = self.storage.load('expense')
+            self.income_data = self.storage.load('income')
+        self.datasets = {'expense': self.expense_data, 'income': self.income_data}
+        self.trans_index = TransactionIndex()
+        self.aggregates = DailyAggregates()
+        self.undo_log = UndoLog(
+            os.path.join(self.data_dir, "undo.jsonl"), configured_undo_depth(self.data_dir), configured_undo_bytes(self.data_dir)
+        )
+        self.recurring = RecurringRules(os.path.join(self.data_dir, "recurring.json"))
+        self.search_index = None
+        self.version = 0
+        self.fetched = 0
+        self.merged = 0
+
+        if self.storage.lazy:
+            self.storage.add_month_listener(self.index_loaded_days)
+        else:
+
+            with perf.measure('build_indexes'):
+                assigned = self.add_ids_to_data()
+                self.trans_index.build(self.datasets)
+                self.aggregates.build(self.datasets)
+            for source in assigned:
+                self.storage.save(source, self.storage.detach(source, self.datasets[source]))
+
+    def add_ids_to_data(self):
+        """Convert loaded dicts to compact Transactions and add unique IDs where missing
+
+        Returns the sources that were given new ids. They are written back
+        straight away, before anything is journaled against those ids, or
+        the next launch would hand the same rows different ones.
+        """
+        assigned = set()
+        for source, data in self.datasets.items():
+            compact_days(data)
+
+            if assign_missing_ids(data):
+                assigned.add(source)
+        return assigned
+
+    def index_loaded_days(self, source, days):
+        """Compact, index and aggregate a month as soon as lazy storage reads it
+
+        Months where rows had to be given ids are queued for rewriting ahead
+        of any journal record that could refer to them.
+        """
+        compact_days(days)
+        assigned = {date[:7] for date in assign_missing_ids(days)}
+        for date, transactions in days.items():
+            for trans in transactions:
+                self.track(source, date, trans)
+            self.trans_index.index_day(source, date, transactions)
+        for month in sorted(assigned):
+            month_days = {date: [as_dict(t) for t in trans] for date, trans in days.items() if date.startswith(month)}
+            self.writer(('month', source, month), self.storage.write_month, month_days, (source, month))
+        self.version += 1
+
+    def track(self, source, date, trans):
+        """Count a transaction in the aggregates and, once built, the search index"""
+        self.aggregates.add(source, date, trans)
+
+        if self.search_index is not None:
+            self.search_index.add(source, trans)
+
+    def untrack(self, source, date, trans):
+        self.aggregates.remove(source, date, trans)
+
+        if self.search_index is not None:
+            self.search_index.remove(source, trans)
+
+    @perf.timed('save_data')
+    def save(self, source):
+        """Journal transactions appended to the day lists directly instead of through insert()
+
+        They are adopted into the index, aggregates and search index and
+        written as add records, so a save costs one small append however
+        much is stored. Returns them as [(source, date, trans)].
+        """
+        adopted = self.adopt_untracked(source)
+
+        if adopted:
+            self.version += 1
+            self.record_many([("add", source, date, trans, None) for source, date, trans in adopted])
+        return adopted
+
+    def adopt_untracked(self, source):
+        """Compact, index and count loaded transactions missing from the id index
+
+        Rows added this way are appended, so a day whose last row is indexed
+        is skipped without looking at the rest.
+        """
+        adopted = []
+        entries = self.trans_index.entries
+        for date, day in self.loaded_days(source):
+
+            if not day or id_key(day[-1]) in entries:
+                continue
+            assign_missing_ids({date: day})
+            for position, trans in enumerate(day):
+
+                if id_key(trans) in entries:
+                    continue
+                trans = day[position] = Transaction.from_dict(trans)
+                self.trans_index.add(trans['id'], source, date, position)
+                self.track(source, date, trans)
+                adopted.append((source, date, trans))
+        return adopted
+
+    def record(self, op, source, date, trans, index=None):
+        """Queue a single mutation record instead of rewriting all stored data"""
+        self.writer(None, self.storage.record, op, source, date, as_dict(trans), index)
+        self.compact_if_needed()
+
+    def record_many(self, records):
+        """Queue a batch of (op, source, date, trans, index) records as one write"""
+
+        if not records:
+            return
+        self.writer(None, self.storage.record_many, [(op, s, d, as_dict(t), i) for op, s, d, t, i in records])
+        self.compact_if_needed()
+
+    def compact_if_needed(self):
+
+        if self.storage.needs_compaction():
+            self.writer('compact', self.compact)
+
+    def compact(self):
+        """Fold the journal into storage, copying the loaded data on the writer's thread
+
+        Nothing is copied on the caller's thread, which may be Tk's. A copy
+        taken while memory changed is dropped; compaction is queued again by
+        the next mutation, as it is while changes fetched from other
+        processes wait to be merged. Journal records are idempotent, so a
+        copy that already holds changes still waiting to be journaled is
+        harmless.
+        """
+        version = self.version
+
+        if self.fetched != self.merged:
+            return
+
+        try:
+            snapshots = self.storage.snapshot()
+
+        except RuntimeError:
+            return
+
+        if version == self.version:
+            self.storage.compact(snapshots, self.storage.checkpoint())
+
+    @staticmethod
+    def new_transaction(source, amount, category, time=None, bonus=None, note=None, trans_id=None):
+        trans = {
+            'id': trans_id or str(uuid.uuid4()),
+            'time': time or datetime.now().strftime(TIME_FORMAT),
+            'category': category,
+            'amount': amount
+        }
+
+        if source == 'income':
+            trans['bonus'] = bonus or 0
+
+        if note:
+            trans['note'] = note
+        return Transaction(trans)
+
+    def insert(self, source, date, trans):
+        """Append a transaction in memory and keep the index and aggregates current"""
+        day = self.datasets[source].setdefault(date, [])
+        day.append(trans)
+        self.trans_index.add(trans['id'], source, date, len(day) - 1)
+        self.track(source, date, trans)
+        self.version += 1
+
+    def add(self, source, amount, category, date=None, time=None, bonus=None, note=None):
+        """Add one transaction and return it"""
+        date = date or datetime.now().strftime(DATE_FORMAT)
+        trans = self.new_transaction(source, amount, category, time, bonus, note)
+        self.insert(source, date, trans)
+        self.record("add", source, date, trans)
+        self.remember('add', [[source, date, as_dict(trans), None]])
+        return trans
+
+    @perf.timed('ledger.add_many')
+    def add_many(self, rows):
+        """Add (source, date, fields) rows with a single batched write; returns [(source, date, trans)]
+
+        fields holds amount, category and optionally time, bonus, note and id.
+        Rows without a time are stamped midnight rather than the current time.
+        The whole batch is undone as one step. rows may be a generator; it is
+        read and turned into transactions in full before anything is
+        inserted, so a row that fails to parse leaves the ledger untouched.
+        """
+        added = [
+            (source, date, self.new_transaction(
+                source, fields['amount'], fields['category'],
+                fields.get('time') or "00:00:00", fields.get('bonus'), fields.get('note'), fields.get('id')
+            ))
+            for source, date, fields in rows
+        ]
+        for source, date, trans in added:
+            self.insert(source, date, trans)
+        self.record_many([("add", source, date, trans, None) for source, date, trans in added])
+        self.remember('add', [[source, date, as_dict(trans), None] for source, date, trans in added])
+        return added
+
+    def locate(self, trans_id, source=None, date=None):
+        """Return (source, date, position) for a transaction id, or None"""
+        return self.trans_index.locate(self.datasets, trans_id, source, date)
+
+    def get(self, trans_id, source=None, date=None):
+        entry = self.locate(trans_id, source, date)
+
+        if entry is None:
+            return None
+        source, date, position = entry
+        return self.datasets[source][date][position]
+
+    def edit(self, trans_id, **fields):
+        """Update fields of one transaction in place and return it"""
+        entry = self.locate(trans_id)
+
+        if entry is None:
+            return None
+        source, date, position = entry
+        trans = self.datasets[source][date][position]
+        before = {key: trans.get(key) for key in fields}
+        self.apply_fields(source, date, trans, fields)
+        self.remember('edit', [[trans_id, source, date, before, dict(fields)]])
+        return trans
+
+    def note_edit(self, trans_id, source, date, before):
+        """Journal and remember an edit already made in place elsewhere, given a copy of the transaction beforehand"""
+        trans = self.get(trans_id, source, date)
+
+        if trans is None:
+            return None
+        keys = [key for key in set(before) | set(trans) if before.get(key) != trans.get(key)]
+
+        if not keys:
+            return None
+        self.untrack(source, date, before)
+        self.track(source, date, trans)
+        self.version += 1
+        self.record("edit", source, date, trans)
+        self.remember('edit', [[trans_id, source, date, {k: before.get(k) for k in keys}, {k: trans.get(k) for k in keys}]])
+        return trans
+
+    def apply_fields(self, source, date, trans, fields):
+        """Set fields on a stored transaction; None removes the field"""
+        self.untrack(source, date, trans)
+        for key, value in fields.items():
+
+            if value is None:
+                trans.pop(key, None)
+            else:
+                trans[key] = value
+        self.track(source, date, trans)
+        self.version += 1
+        self.record("edit", source, date, trans)
+
+    @perf.timed('ledger.delete')
+    def delete(self, items):
+        """Delete (id, source, date) items; source/date are hints for unindexed rows
+
+        Returns the deleted transactions.
+        """
+        ids_by_day = {}
+        for trans_id, source, date in items:
+            entry = self.locate(trans_id, source, date)
+
+            if entry is not None:
+                ids_by_day.setdefault(entry[:2], set()).add(trans_id)
+        removed = self.remove(ids_by_day)
+
+        if removed:
+            self.remember('delete', [[source, date, as_dict(trans), index] for source, date, trans, index in removed])
+        return [trans for source, date, trans, index in removed]
+
+    def remove(self, ids_by_day):
+        """Drop {(source, date): ids} from memory and storage; returns [(source, date, trans, index)]"""
+        removed = []
+        for (source, trans_date), ids in ids_by_day.items():
+            day = self.datasets[source][trans_date]
+            kept = []
+            for i, t in enumerate(day):
+
+                if t.get('id') in ids:
+                    removed.append((source, trans_date, t, i))
+                    self.trans_index.remove(t['id'])
+                    self.untrack(source, trans_date, t)
+                else:
+                    kept.append(t)
+            day[:] = kept
+            self.trans_index.index_day(source, trans_date, day)
+        self.version += 1
+        self.record_many([("delete", source, date, trans, None) for source, date, trans, index in removed])
+        return removed
+
+    def restore(self, items):
+        """Put [source, date, trans, index] items back, skipping ids that are already present"""
+        restored = []
+        for source, trans_date, trans, index in items:
+
+            if self.locate(trans['id'], source, trans_date) is not None:
+                continue
+            trans = Transaction(trans)
+            day = self.datasets[source].setdefault(trans_date, [])
+
+            if index is not None and index <= len(day):
+                day.insert(index, trans)
+            else:
+                day.append(trans)
+            self.track(source, trans_date, trans)
+            restored.append((source, trans_date, trans, index))
+        self.version += 1
+        self.record_many([("add", source, date, trans, index) for source, date, trans, index in restored])
+        for source, trans_date in {(s, d) for s, d, t, i in restored}:
+            self.trans_index.index_day(source, trans_date, self.datasets[source][trans_date])
+        return [(source, date, trans) for source, date, trans, index in restored]
+
+    def remember(self, op, items):
+        """Push a command onto the undo log and persist the log in the background"""
+        self.undo_log.push({'op': op, 'items': items})
+        self.save_undo_log()
+
+    def save_undo_log(self):
+        """Append the log's new events, or rewrite it once it has grown well past what is still live"""
+
+        if self.undo_log.needs_rewrite():
+            self.writer('undo', self.undo_log.write, self.undo_log.state())
+        else:
+            self.writer(None, self.undo_log.append, self.undo_log.take_events())
+
+    def run_command(self, command, reverse):
+        """Apply a logged command forwards (redo) or backwards (undo)
+
+        Returns [(change, source, date, trans)] where change is 'add',
+        'delete' or 'edit', so a view can patch itself instead of reloading.
+        """
+        op = command['op']
+
+        if op == 'add_ids':
+            op = 'add'
+            items = [[source, date, {'id': trans_id}, None] for source, date, ids in command['days'] for trans_id in ids]
+        else:
+            items = command['items']
+
+        if op == 'edit':
+            changes = []
+            for trans_id, source, date, before, after in items:
+                trans = self.get(trans_id, source, date)
+
+                if trans is not None:
+                    self.apply_fields(source, date, trans, before if reverse else after)
+                    changes.append(('edit', source, date, trans))
+            return changes
+
+        if (op == 'add') == reverse:
+            ids_by_day = {}
+            for source, date, trans, index in items:
+                entry = self.locate(trans['id'], source, date)
+
+                if entry is not None:
+                    ids_by_day.setdefault(entry[:2], set()).add(trans['id'])
+            return [('delete', s, d, t) for s, d, t, i in self.remove(ids_by_day)]
+        return [('add', s, d, t) for s, d, t in self.restore(sorted(items, key=lambda item: item[3] or 0))]
+
+    @perf.timed('ledger.undo')
+    def undo(self):
+        """Reverse the most recent add, edit or delete; returns the changes made"""
+
+        if not self.undo_log.can_undo():
+            return []
+        changes = self.run_command(self.undo_log.pop_undo(), reverse=True)
+        self.save_undo_log()
+        return changes
+
+    @perf.timed('ledger.redo')
+    def redo(self):
+        """Replay the most recently undone command; returns the changes made"""
+
+        if not self.undo_log.can_redo():
+            return []
+        changes = self.run_command(self.undo_log.pop_redo(), reverse=False)
+        self.save_undo_log()
+        return changes
+
+    @perf.timed('ledger.sync')
+    def sync(self):
+        """Merge in what other processes wrote to the data files; returns True if anything changed
+
+        Appended journal records are applied one day at a time. Snapshots
+        or months rewritten elsewhere replace their days in memory, after
+        which the index and aggregates are rebuilt. Transactions are matched
+        by id, so non-conflicting changes from both sides survive; for the
+        same id the later write wins.
+        """
+
+        if self.flush is not None:
+            self.flush()
+        return self.merge_changes(self.storage.changes())
+
+    def fetch_changes(self):
+        """storage.changes() on the writer's thread, for merge_changes() to apply on the caller's
+
+        Compaction is held off until the result is merged, or it would fold
+        away journal records memory does not hold yet.
+        """
+        changes = self.storage.changes()
+        self.fetched += 1
+        return changes
+
+    def merge_changes(self, changes, version=None):
+        """Apply the (records, reloaded) pair from storage.changes(); returns True if anything changed
+
+        version is the ledger's version when fetch_changes() was queued on
+        another thread, and is given only for its results. If memory has changed since, the reloaded days may
+        predate those changes, so they are handed back to storage to be read
+        again on the next sync rather than replacing memory.
+        """
+        records, reloaded = changes
+
+        if version is not None:
+            self.merged += 1
+
+        if reloaded and version is not None and version != self.version:
+            self.writer(None, self.storage.mark_stale, reloaded)
+            reloaded = []
+
+        if not records and not reloaded:
+            return False
+
+        if not reloaded:
+            for record in records:
+                self.merge_record(record)
+            self.version += 1
+            return True
+        for source, month, days in reloaded:
+            data = self.datasets[source]
+            for date, transactions in self.loaded_days(source):
+
+                if month is None or date.startswith(month):
+                    del data[date]
+            data.update(days)
+        for record in records:
+            TransactionJournal.apply(record, self.datasets)
+        loaded = {source: compact_days(dict(self.loaded_days(source))) for source in SOURCES}
+        self.trans_index.build(loaded)
+        self.aggregates.build(loaded)
+
+        if self.search_index is not None:
+            self.search_index.build(loaded)
+        self.version += 1
+        return True
+
+    def loaded_days(self, source):
+        """(date, transactions) pairs in memory, without reading any more of lazy storage"""
+        data = self.datasets[source]
+        return data.loaded_items() if self.storage.lazy else list(data.items())
+
+    def merge_record(self, record):
+        """Apply one journal record from another process, keeping the index and aggregates current"""
+        source, date = record.get('source'), record.get('date')
+
+        if source not in self.datasets:
+            return
+        day = self.datasets[source].get(date, [])
+        for trans in day:
+            self.untrack(source, date, trans)
+            self.trans_index.remove(trans['id'])
+        TransactionJournal.apply(record, self.datasets)
+        day = self.datasets[source].get(date, [])
+        compact_days({date: day})
+        self.trans_index.index_day(source, date, day)
+        for trans in day:
+            self.track(source, date, trans)
+
+    def add_rule(self, source, amount, category, frequency, start, **options):
+        """Create and store a recurring rule (see RecurringRules.add)"""
+        rule = self.recurring.add(source, amount, category, frequency, start, **options)
+        self.save_rules()
+        return rule
+
+    def remove_rule(self, rule_id):
+        """Stop a recurring rule; transactions it already added are kept"""
+        removed = self.recurring.remove(rule_id)
+
+        if removed:
+            self.save_rules()
+        return removed
+
+    def save_rules(self):
+        self.writer('recurring', self.recurring.write, self.recurring.state())
+
+    @perf.timed('ledger.materialize_recurring')
+    def materialize_recurring(self, today=None):
+        """Add every rule occurrence due up to today in one batched write; returns [(source, date, trans)]
+
+        Occurrence ids are derived from the rule and date, so an occurrence
+        another instance already added is skipped rather than duplicated.
+        """
+        today = today or datetime.now().strftime(DATE_FORMAT)
+        self.sync()
+        self.recurring.reload()
+        rows = []
+        for rule, date in self.recurring.due(today):
+            trans_id = occurrence_id(rule, date)
+
+            if self.locate(trans_id, rule['source'], date) is None:
+                fields = {key: rule[key] for key in ('amount', 'category', 'time', 'bonus', 'note') if rule.get(key) is not None}
+                rows.append((rule['source'], date, dict(fields, id=trans_id)))
+        added = self.add_many(rows) if rows else []
+
+        if self.recurring.mark_materialized(today):
+            self.save_rules()
+        return added
+
+    def forecast(self, start, end=None):
+        """Totals between start and end: what is recorded plus what recurring rules have yet to add
+
+        Future occurrences are counted per rule rather than materialized, so
+        projecting years ahead costs no more than a month.
+        """
+        end = end or start
+        totals = self.totals(start, end)
+        for key, value in self.recurring.forecast(start, end).items():
+            totals[key] = round(totals[key] + value, 2)
+        return totals
+
+    def ensure_range(self, start, end):
+        """Make sure lazily stored months covering start..end are in memory"""
+
+        if self.storage.lazy:
+            for source in SOURCES:
+                self.storage.load_range(source, start, end)
+
+    def range_query(self, start, end=None):
+        """Yield (source, date, trans) for every transaction between start and end inclusive"""
+        end = end or start
+        for date in dates_between(start, end):
+            for source in SOURCES:
+                for trans in self.datasets[source].get(date, []):
+                    yield source, date, trans
+
+    @perf.timed('ledger.totals')
+    def totals(self, start, end=None):
+        """Income, expense and bonus totals between start and end inclusive"""
+        end = end or start
+        self.ensure_range(start, end)
+        return self.aggregates.totals(start, end)
+
+    def category_totals(self, source, start, end=None):
+        end = end or start
+        self.ensure_range(start, end)
+        return self.aggregates.category_totals(source, start, end)
+
+    def ensure_search_index(self):
+        """Build the search index over the whole history on first use; later changes update it in place"""
+
+        if self.search_index is None:
+
+            with perf.measure('ledger.search_index'):
+
+                if self.storage.lazy:
+                    for source in SOURCES:
+                        self.storage.ensure_all(source)
+                index = SearchIndex()
+                index.build({source: dict(self.loaded_days(source)) for source in SOURCES})
+                self.search_index = index
+        return self.search_index
+
+    def resolve(self, key):
+        """(source, date, trans) for an index key, or None"""
+        entry = self.locate(key)
+
+        if entry is None:
+            return None
+        source, date, position = entry
+        return source, date, self.datasets[source][date][position]
+
+    @perf.timed('ledger.search')
+    def search(self, text, today=None):
+        """[(source, date, trans)] matching search bar text (see search.parse_query), oldest first
+
+        Candidates come from the inverted index; a query with only dates, or
+        nothing at all, walks the days in that range instead.
+        """
+        index = self.ensure_search_index()
+        query = parse_query(text, index.category_names(), today)
+        matches = index.search(query, self.resolve)
+
+        if matches is None:
+            start, end = query['start'] or '', query['end'] or '9999-12-31'
+            matches = [
+                (source, date, trans) for source in SOURCES for date, day in self.loaded_days(source)
+                if start <= date <= end for trans in day
+            ]
+            matches.sort(key=lambda found: (found[1], found[2].get('time', '')))
+        return matches
+
+    def close(self):
+        self.storage.close()
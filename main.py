@@ -1,15 +1,26 @@
+from timing import StartupTimer
 import configparser
 import ctypes
 import shutil
 import sys
+import threading
+import time
 import tkinter as tk
-from tkinter import messagebox, ttk
-import json
+from tkinter import filedialog, messagebox, ttk
 import os
-from datetime import datetime
-from tkcalendar import Calendar
-from PIL import Image, ImageTk
+from datetime import datetime, timedelta
 import uuid
+from ledger import Ledger, source_of
+from history_view import HistoryView
+from io_worker import IOWorker
+from safe_io import atomic_write
+from importer import StatementError, import_statement
+from exporter import export_lines, export_steps
+from analytics import Analytics, AnalyticsUnavailable
+from recurring import FREQUENCIES, RuleError, describe
+from search import match_totals
+from perf import perf
+from transaction import as_dict
 
 if sys.platform == "win32":
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("YourAppID.UniqueName")
@@ -28,10 +39,38 @@ def resource_path(relative_path):
         raise FileNotFoundError(f"Resource not found: {full_path}")
     return full_path
 
+Calendar = None
+
+def load_calendar():
+    """Import tkcalendar on first use; only the date pickers need it"""
+    global Calendar
+
+    if Calendar is None:
+
+        with perf.measure('import tkcalendar'):
+            from tkcalendar import Calendar as calendar_class
+        Calendar = calendar_class
+
+def load_icon(relative_path, size, cache_dir):
+    """PhotoImage of an icon resized once with Pillow and cached as PNG for later launches"""
+    source = resource_path(relative_path)
+    name = os.path.splitext(os.path.basename(source))[0]
+    cached = os.path.join(cache_dir, f"{name}_{size[0]}x{size[1]}.png")
+
+    if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(source):
+        from PIL import Image
+        os.makedirs(cache_dir, exist_ok=True)
+        Image.open(source).resize(size, Image.LANCZOS).save(cached)
+    return tk.PhotoImage(file=cached)
+
 class FinanceTracker:
 
     def __init__(self, root):
+        self.timer = StartupTimer()
+        self.timer.mark('imports')
         self.root = root
+        for name in ('update_display', 'select_single_date', 'select_date_range'):
+            setattr(self, name, perf.timed(name)(getattr(self, name)))
         self.root.title("Finance Tracker")
         self.root.geometry("700x770")
         self.root.resizable(True, True)
@@ -57,21 +96,93 @@ class FinanceTracker:
         self.expense_file = os.path.join(self.data_dir, "expenses.json")
         self.income_file = os.path.join(self.data_dir, "income.json")
         self.config_file = os.path.join(self.data_dir, "config.ini")
+        self.data_sources = {self.expense_file: 'expense', self.income_file: 'income'}
         self.migrate_old_files()
+        self.io_worker = IOWorker()
+        self.ledger = None
+        self.load_error = None
+        self.loader = threading.Thread(target=self.load_ledger, daemon=True)
+        self.loader.start()
         self.range_start_date = None
         self.range_end_date = None
         self.trans_type = tk.StringVar(value=self.load_last_transaction_type() or "Expense")
-        self.expense_data = self.load_data(self.expense_file)
-        self.income_data = self.load_data(self.income_file)
-        self.add_ids_to_data()
+        self.pending_edit = None
+        self.last_sync_check = 0
+        self.analytics = None
+        self.search_matches = None
+        self.search_range = None
+        self.search_job = None
+        self.dates_text = None
         self.current_date = datetime.now().strftime("%Y-%m-%d")
-        self.undo_stack = []
         self.load_window_geometry()
         self.create_widgets()
-        self.update_display()
+        self.timer.mark('widgets')
         root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind('<Map>', lambda event: self.timer.mark('first paint'), add='+')
+        self.root.config(cursor="watch")
+        self.root.after_idle(self.show_calendar_icon)
+        self.root.after(20, self.finish_startup)
+        self.poll_io()
+
+    def load_ledger(self):
+        """Open storage and parse the data files off the Tk thread"""
+
+        try:
+            self.ledger = Ledger(self.data_dir, writer=self.io_worker.submit, flush=self.io_worker.flush)
+
+        except Exception as e:
+            self.load_error = e
+
+    def finish_startup(self):
+        """Once the background load is done, wire up the data and show history"""
+
+        if self.loader.is_alive():
+            self.root.after(20, self.finish_startup)
+            return
+        self.root.config(cursor="")
+
+        if self.load_error is not None:
+            messagebox.showerror("Load Error", f"Could not load data: {self.load_error}")
+            self.root.destroy()
+            return
+        self.timer.mark('data loaded')
+        self.storage = self.ledger.storage
+        self.expense_data = self.load_data(self.expense_file)
+        self.income_data = self.load_data(self.income_file)
+        self.datasets = self.ledger.datasets
+        self.report_recovery()
+        self.ledger.materialize_recurring()
+        self.show_history()
+        self.enable_data_controls()
+        self.schedule_rollover()
         self.root.bind('<Delete>', self.delete_selected)
-        self.root.bind("<Control-z>", self.undo_delete)
+        self.root.bind("<Control-z>", self.undo_change)
+        self.root.bind("<Control-y>", self.redo_change)
+        self.root.bind("<Control-Shift-D>", self.show_diagnostics)
+        self.root.bind('<FocusIn>', self.check_other_instances, add='+')
+        self.root.after(5000, self.poll_other_instances)
+        self.timer.mark('history shown')
+        self.io_worker.submit('startup', self.timer.write, os.path.join(self.data_dir, "startup.log"), self.timer.entry())
+
+    def enable_data_controls(self):
+        """Turn on the Add button and the Dates menu, which need the loaded ledger"""
+        self.add_button.config(state=tk.NORMAL)
+
+        try:
+            self.cal_menu.config(state=tk.NORMAL)
+
+        except AttributeError:
+            pass
+
+    def show_calendar_icon(self):
+        """Swap the calendar menu's text for its icon after the first paint"""
+
+        try:
+            self.cal_img = load_icon("icons/calender.png", (25, 25), os.path.join(self.data_dir, "cache"))
+            self.cal_menu.config(image=self.cal_img)
+
+        except Exception as e:
+            print("Icon load error:", e)
 
     def migrate_old_files(self):
         """Move existing files to hidden directory"""
@@ -102,8 +213,6 @@ class FinanceTracker:
 
                 if geometry:
                     self.root.geometry(geometry)
-                    self.root.update_idletasks()
-                    self.root.update()
 
                 if state == "zoomed":
                     self.root.state("zoomed")
@@ -124,6 +233,7 @@ class FinanceTracker:
     def save_window_geometry(self):
         """Save window geometry and last transaction type"""
         config = configparser.ConfigParser()
+        config.read(self.config_file)
         config["Geometry"] = {
             "size": self.root.geometry(),
             "state": self.root.state()
@@ -131,23 +241,68 @@ class FinanceTracker:
         config["MainWindow"] = {
             "last_transaction_type": self.trans_type.get()
         }
+        self.io_worker.submit('config', self.write_config, config)
 
-        with open(self.config_file, "w") as f:
-            config.write(f)
+    def write_config(self, config):
+        atomic_write(self.config_file, config.write)
 
     def on_close(self):
         """Handle window close event"""
         self.save_window_geometry()
+
+        if perf.enabled:
+            self.io_worker.submit('perf', self.write_perf_log)
+        self.io_worker.stop()
+        self.io_worker.dispatch(self.report_io_error)
+
+        if self.ledger is not None:
+            self.ledger.close()
         root.destroy()
 
-    def add_ids_to_data(self):
-        """Add unique IDs to transactions if missing"""
-        for data in [self.expense_data, self.income_data]:
-            for date, transactions in data.items():
-                for trans in transactions:
+    def check_other_instances(self, event=None):
+        """Merge what another running Finance Tracker wrote and redraw if anything changed
 
-                    if 'id' not in trans:
-                        trans['id'] = str(uuid.uuid4())
+        Only a few stat calls happen on the Tk thread; reading what changed
+        is done by the I/O worker and merged when its result comes back.
+        Focus events within two seconds of the last check are ignored.
+        """
+        now = time.monotonic()
+
+        if event is not None and now - self.last_sync_check < 2:
+            return
+        self.last_sync_check = now
+
+        if not self.storage.has_changes():
+            return
+        version = self.ledger.version
+        self.io_worker.submit(
+            'sync', self.ledger.fetch_changes,
+            callback=lambda changes: self.merge_other_instances(changes, version)
+        )
+
+    def merge_other_instances(self, changes, version):
+
+        if self.ledger.merge_changes(changes, version):
+            self.show_history()
+
+    def poll_other_instances(self):
+        self.check_other_instances()
+        self.root.after(5000, self.poll_other_instances)
+
+    def poll_io(self):
+        """Run callbacks for finished background I/O on the Tk thread"""
+        self.io_worker.dispatch(self.report_io_error)
+        self.root.after(100, self.poll_io)
+
+    def report_recovery(self):
+        """Tell the user when a corrupt data file was restored from a backup"""
+
+        if self.storage.recovered:
+            restored = "\n".join(f"{os.path.basename(name)} <- {backup}" for name, backup in self.storage.recovered)
+            messagebox.showwarning("Data Recovered", f"Corrupt data files were restored from backups:\n{restored}")
+
+    def report_io_error(self, error):
+        messagebox.showerror("Save Error", f"Could not write data: {error}")
 
     def configure_styles(self):
         """Configure premium-looking styles"""
@@ -189,24 +344,23 @@ class FinanceTracker:
                       foreground=[('active', '#1a2b3c')])
 
     def load_data(self, filename):
-        """Load data from JSON file or create new if doesn't exist"""
+        """Return the loaded data for a data file"""
+        return self.ledger.datasets[self.data_sources[filename]]
 
-        if os.path.exists(filename):
-
-            try:
+    def save_data(self, data, filename):
+        """Journal what the GUI changed in place instead of rewriting the data file
 
-                with open(filename, 'r') as f:
-                    return json.load(f)
+        A pending edit is recorded, and transactions appended straight to the
+        data dict are adopted by the ledger and recorded as one undoable add.
+        """
 
-            except (json.JSONDecodeError, FileNotFoundError):
-                return {}
-        return {}
+        if self.pending_edit is not None:
+            self.ledger.note_edit(*self.pending_edit)
+            self.pending_edit = None
+        adopted = self.ledger.save(self.data_sources[filename])
 
-    def save_data(self, data, filename):
-        """Save data to JSON file"""
-
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=4)
+        if adopted:
+            self.ledger.remember('add', [[source, date, as_dict(trans), None] for source, date, trans in adopted])
 
     def create_widgets(self):
         """Create all GUI widgets"""
@@ -263,8 +417,8 @@ class FinanceTracker:
         self.bonus_entry.pack(side=tk.LEFT)
         button_frame = tk.Frame(input_frame, bg='#f0f0f0')
         button_frame.pack(fill=tk.X, pady=10,padx=5)
-        add_button = ttk.Button(button_frame,  text="Add Transaction", command=self.add_transaction)
-        add_button.pack(pady=5, ipadx=20)
+        self.add_button = ttk.Button(button_frame,  text="Add Transaction", command=self.add_transaction, state=tk.DISABLED)
+        self.add_button.pack(pady=5, ipadx=20)
         totals_frame = ttk.Frame(content_frame, style='Accent.TFrame', padding=10)
         totals_frame.pack(fill=tk.X, pady=(0, 15))
         today_frame = tk.Frame(totals_frame, bg='#e0e7ff')
@@ -292,17 +446,15 @@ class FinanceTracker:
         ).pack(side=tk.LEFT)
 
         try:
-            original_img = Image.open(resource_path(r"icons\calender.png"))
-            resized_img = original_img.resize((25, 25), Image.LANCZOS)
-            self.cal_img = ImageTk.PhotoImage(resized_img)
             self.cal_menu = tk.Menubutton(
                 history_header,
-                image=self.cal_img,
+                text="Dates",
                 font=('Helvetica', 12),
-                relief=tk.RAISED
+                relief=tk.RAISED,
+                state=tk.DISABLED
             )
             self.cal_menu.pack(side=tk.LEFT, padx=20)
-            self.cal_dropdown = tk.Menu(self.cal_menu, tearoff=0)
+            self.cal_dropdown = tk.Menu(self.cal_menu, tearoff=0, postcommand=load_calendar)
             self.cal_menu.config(menu=self.cal_dropdown)
             self.cal_dropdown.add_command(
                 label="Date wise Transaction History",
@@ -312,6 +464,28 @@ class FinanceTracker:
                 label="Transaction History Between Two Dates",
                 command=self.select_date_range
             )
+            self.cal_dropdown.add_separator()
+            self.cal_dropdown.add_command(
+                label="Import Bank Statement...",
+                command=self.import_statement_file
+            )
+            self.cal_dropdown.add_command(
+                label="Export Transactions...",
+                command=self.export_transactions
+            )
+            self.cal_dropdown.add_command(
+                label="Export Monthly Summary...",
+                command=lambda: self.export_transactions(summary=True)
+            )
+            self.cal_dropdown.add_separator()
+            self.cal_dropdown.add_command(
+                label="Spending Analytics...",
+                command=self.show_analytics
+            )
+            self.cal_dropdown.add_command(
+                label="Recurring Transactions...",
+                command=self.show_recurring
+            )
 
         except:
             pass
@@ -322,6 +496,16 @@ class FinanceTracker:
             foreground='black'
         )
         self.date_label.pack(side=tk.RIGHT)
+        search_frame = tk.Frame(history_frame)
+        search_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        tk.Label(search_frame, text="Search:", font=('Helvetica', 11)).pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.search_entry.bind('<Return>', self.run_search)
+        self.search_entry.bind('<KeyRelease>', self.schedule_search)
+        self.search_entry.bind('<Escape>', self.clear_search)
+        ttk.Button(search_frame, text="Clear", command=self.clear_search).pack(side=tk.LEFT)
         columns = ('Time', 'Type', 'Category', 'Amount')
         self.history_tree = ttk.Treeview(
             history_frame,
@@ -338,7 +522,7 @@ class FinanceTracker:
         self.history_tree.heading('Category', text='Category')
         self.history_tree.heading('Amount', text='Amount (₹)')
         scrollbar = ttk.Scrollbar(history_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
-        self.history_tree.configure(yscroll=scrollbar.set)
+        self.history = HistoryView(self.history_tree, scrollbar)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.history_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         self.history_tree.tag_configure('expense', foreground='red')
@@ -354,6 +538,408 @@ class FinanceTracker:
         self.daily_balance_label.pack(side=tk.LEFT, padx=(5, 0))
         self.toggle_bonus()
 
+    def displayed_range(self):
+        """Return the (start, end) dates shown in the history view"""
+
+        if self.range_start_date and self.range_end_date:
+            return self.range_start_date, self.range_end_date
+        return self.current_date, self.current_date
+
+    @perf.timed('refresh_totals')
+    def refresh_totals(self):
+        """Update totals and balance labels from the aggregate cache, or from the search results while searching"""
+
+        if self.search_matches is not None:
+            totals = match_totals(self.search_matches)
+        else:
+            start, end = self.displayed_range()
+            totals = self.ledger.totals(start, end)
+        self.today_income_label.config(text=f"₹{totals['income']:.2f}")
+        self.today_expense_label.config(text=f"₹{totals['expense']:.2f}")
+        self.today_bonus_label.config(text=f"₹{totals['bonus']:.2f}")
+        balance = totals['income'] + totals['bonus'] - totals['expense']
+        self.daily_balance_label.config(
+            text=f"₹{balance:.2f}",
+            style='Profit.TLabel' if balance >= 0 else 'Loss.TLabel'
+        )
+
+    def history_row(self, source, date, trans, range_mode):
+        """Build a (sort_key, iid, values, tags) row for the history view"""
+        trans_type = 'Expense' if source == 'expense' else 'Income'
+        amount = f"{float(trans.get('amount') or 0):.2f}"
+        values = (trans.get('time', ''), trans_type, trans.get('category', ''), amount)
+        tags = (source, trans['id'])
+
+        if range_mode:
+            values = (self.format_display_date(date),) + values
+            tags += (date, 'range_mode')
+        return ((date, trans.get('time', '')), trans['id'], values, tags)
+
+    def history_rows(self):
+        """Yield rows for every transaction in the displayed date or range"""
+        start, end = self.displayed_range()
+        range_mode = bool(self.range_start_date and self.range_end_date)
+        for source, date, trans in self.ledger.range_query(start, end):
+            yield self.history_row(source, date, trans, range_mode)
+
+    def configure_history_columns(self, range_mode):
+        """Show a Date column only when viewing a date range"""
+        columns = ('Date', 'Time', 'Type', 'Category', 'Amount') if range_mode else ('Time', 'Type', 'Category', 'Amount')
+
+        if tuple(self.history_tree['columns']) == columns:
+            return
+        self.history_tree.configure(columns=columns)
+        widths = {'Date': 110, 'Time': 100, 'Type': 80, 'Category': 120, 'Amount': 120}
+        for column in columns:
+            self.history_tree.column(column, width=widths[column], anchor=tk.CENTER)
+            self.history_tree.heading(column, text='Amount (₹)' if column == 'Amount' else column)
+
+    @perf.timed('show_history')
+    def show_history(self):
+        """Load the displayed date or range into the paged history view and totals
+
+        While a search is active its results are shown instead, unless the
+        date or range has been changed since, which ends the search.
+        """
+
+        if self.search_matches is not None:
+
+            if self.search_range == self.displayed_range():
+                self.show_search_results()
+                return
+            self.search_matches = None
+            self.search_var.set('')
+        self.configure_history_columns(bool(self.range_start_date and self.range_end_date))
+        self.history.set_rows(self.history_rows())
+        self.refresh_totals()
+
+    def schedule_search(self, event=None):
+        """Search shortly after typing pauses, so results follow the search bar"""
+
+        if event is not None and event.keysym in ('Return', 'Escape'):
+            return
+
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(300, self.run_search)
+
+    def run_search(self, event=None):
+        """Show every transaction in the whole history matching the search bar"""
+
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+
+        if self.ledger is None:
+            return
+
+        if not self.search_var.get().strip():
+            self.clear_search()
+            return
+
+        if self.search_matches is None:
+            self.dates_text = self.date_label.cget('text')
+            self.search_range = self.displayed_range()
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+
+        try:
+            self.show_search_results()
+
+        finally:
+            self.root.config(cursor="")
+
+    @perf.timed('show_search_results')
+    def show_search_results(self):
+        """Run the search bar's query and stream the matches into the history view, oldest first"""
+
+        try:
+            self.search_matches = self.ledger.search(self.search_var.get().strip())
+            status = f"Search: {len(self.search_matches)} found"
+
+        except ValueError as e:
+            self.search_matches = []
+            status = f"Search: {e}"
+        self.configure_history_columns(True)
+        self.history.stream_rows(self.history_row(source, date, trans, True) for source, date, trans in self.search_matches)
+        self.date_label.config(text=status)
+        self.refresh_totals()
+
+    def clear_search(self, event=None):
+        """Empty the search bar and go back to the displayed date or range"""
+
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+        self.search_var.set('')
+
+        if self.search_matches is not None:
+            self.search_matches = None
+            self.date_label.config(text=self.dates_text)
+            self.show_history()
+
+    def import_statement_file(self):
+        """Import a CSV/OFX statement in one batch and refresh the history once"""
+        path = filedialog.askopenfilename(
+            title="Import Bank Statement",
+            filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("All files", "*.*")]
+        )
+
+        if not path:
+            return
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+
+        try:
+            added, skipped = import_statement(self.ledger, path, self.category['values'])
+
+        except (StatementError, ValueError, OSError) as e:
+            messagebox.showerror("Import Failed", str(e))
+            return
+
+        finally:
+            self.root.config(cursor="")
+        self.show_history()
+        messagebox.showinfo("Import Complete", f"Imported {len(added)} transactions.\nSkipped {skipped} already present.")
+
+    def export_transactions(self, summary=False):
+        """Export the displayed date or range, writing a chunk per Tk idle tick"""
+        start, end = self.displayed_range()
+        default_name = f"transactions_{start}_{end}"
+
+        if summary:
+            filetypes = [("CSV", "*.csv")]
+            default_name = f"summary_{start}_{end}"
+        else:
+            filetypes = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl")]
+        path = filedialog.asksaveasfilename(
+            title="Export Summary" if summary else "Export Transactions",
+            initialfile=default_name,
+            defaultextension=".csv",
+            filetypes=filetypes
+        )
+
+        if not path:
+            return
+        fmt = 'summary' if summary else ('jsonl' if path.lower().endswith(".jsonl") else 'csv')
+        steps = export_steps(export_lines(self.ledger, fmt, start, end), path)
+
+        def step():
+
+            try:
+                written = next(steps)
+
+            except StopIteration:
+                self.root.title("Finance Tracker")
+                messagebox.showinfo("Export Complete", f"Saved {os.path.basename(path)}")
+                return
+
+            except OSError as e:
+                self.root.title("Finance Tracker")
+                messagebox.showerror("Export Failed", str(e))
+                return
+            self.root.title(f"Finance Tracker - exporting ({written} rows)")
+            self.root.after(1, step)
+
+        self.root.after(1, step)
+
+    def analytics_range(self):
+        """Displayed range, or the twelve months up to the displayed date when viewing a single day"""
+
+        if self.range_start_date and self.range_end_date:
+            return self.range_start_date, self.range_end_date
+        year, month = int(self.current_date[:4]), int(self.current_date[5:7])
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+        return f"{year - 1}-{month:02d}-01", self.current_date
+
+    def add_analytics_table(self, notebook, title, columns, rows):
+        frame = ttk.Frame(notebook, padding=5)
+        table = ttk.Treeview(frame, columns=columns, show='headings', height=14)
+        for column in columns:
+            table.column(column, width=100, anchor=tk.CENTER)
+            table.heading(column, text=column)
+        for row in rows:
+            table.insert('', 'end', values=row)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.HORIZONTAL, command=table.xview)
+        table.configure(xscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        table.pack(fill=tk.BOTH, expand=True)
+        notebook.add(frame, text=title)
+
+    def show_analytics(self):
+        """Open a window with monthly trends and category breakdowns"""
+
+        try:
+
+            if self.analytics is None:
+                self.analytics = Analytics(self.ledger)
+
+        except AnalyticsUnavailable as e:
+            messagebox.showerror("Analytics", str(e))
+            return
+        start, end = self.analytics_range()
+        monthly = self.analytics.monthly_totals(start, end)
+        dates, averages = self.analytics.rolling_average(start, end)
+        months, categories, spend = self.analytics.spend_by_category(start, end)
+        month_end_average = {}
+        for day, average in zip(dates, averages):
+            month_end_average[day[:7]] = average
+        top = tk.Toplevel(self.root)
+        top.title(f"Analytics {self.format_display_date(start)} - {self.format_display_date(end)}")
+        top.geometry("640x420")
+        notebook = ttk.Notebook(top)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.add_analytics_table(
+            notebook, "Monthly",
+            ('Month', 'Income', 'Expense', 'Change', 'Balance', '30-day Avg'),
+            [(month, f"{monthly['income'][i]:.2f}", f"{monthly['expense'][i]:.2f}",
+              f"{monthly['expense_delta'][i]:+.2f}", f"{monthly['balance'][i]:.2f}",
+              f"{month_end_average.get(month, 0):.2f}") for i, month in enumerate(monthly['months'])]
+        )
+        self.add_analytics_table(
+            notebook, "By Category",
+            ('Month',) + tuple(categories),
+            [(month,) + tuple(f"{value:.2f}" for value in spend[i]) for i, month in enumerate(months)]
+        )
+        self.add_analytics_table(
+            notebook, "Top Categories",
+            ('Category', 'Spent'),
+            [(category, f"{total:.2f}") for category, total in self.analytics.top_categories(start, end, count=10)]
+        )
+
+    def schedule_rollover(self):
+        """Call rollover just after the coming midnight"""
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        self.root.after(int((midnight - now).total_seconds() * 1000) + 1000, self.rollover, now.strftime("%Y-%m-%d"))
+
+    def rollover(self, previous):
+        """At midnight, move a view of today on to the new day and add recurring transactions now due"""
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        if today != previous:
+
+            if self.current_date == previous and not (self.range_start_date and self.range_end_date):
+                self.current_date = today
+                self.date_label.config(text=f"Date: {self.format_display_date(self.current_date)}")
+            self.ledger.materialize_recurring(today)
+            self.show_history()
+        self.schedule_rollover()
+
+    def show_recurring(self):
+        """Window listing recurring rules, with a form to add one and a balance projection"""
+        top = tk.Toplevel(self.root)
+        top.title("Recurring Transactions")
+        top.geometry("720x460")
+        columns = ('Type', 'Category', 'Amount', 'Repeats', 'Next')
+        table = ttk.Treeview(top, columns=columns, show='headings', height=8)
+        for column in columns:
+            table.column(column, width=120, anchor=tk.CENTER)
+            table.heading(column, text=column)
+        table.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        form = ttk.Frame(top)
+        form.pack(fill=tk.X, padx=10)
+        rule_type = ttk.Combobox(form, values=('Expense', 'Income'), width=8, state="readonly")
+        rule_type.set(self.trans_type.get())
+        category = ttk.Combobox(form, values=self.category['values'], width=12, state="readonly")
+        category.current(0)
+        amount = ttk.Entry(form, width=10)
+        frequency = ttk.Combobox(form, values=FREQUENCIES, width=8, state="readonly")
+        frequency.set('monthly')
+        interval = ttk.Spinbox(form, from_=1, to=365, width=4)
+        interval.set(1)
+        start = ttk.Entry(form, width=11)
+        start.insert(0, self.current_date)
+        for column, (label, widget) in enumerate((
+            ("Type", rule_type), ("Category", category), ("Amount (₹)", amount),
+            ("Repeats", frequency), ("Every", interval), ("Starting", start)
+        )):
+            ttk.Label(form, text=label).grid(row=0, column=column, sticky=tk.W, padx=2)
+            widget.grid(row=1, column=column, padx=2)
+        projection = tk.StringVar()
+
+        def refresh():
+            today = datetime.now().strftime("%Y-%m-%d")
+            table.delete(*table.get_children())
+            for rule in self.ledger.recurring.rules:
+                upcoming = self.ledger.recurring.next_occurrence(rule, today)
+                table.insert('', 'end', iid=rule['id'], values=(
+                    rule['source'].title(), rule['category'], f"{rule['amount']:.2f}", describe(rule),
+                    self.format_display_date(upcoming) if upcoming else "Ended"
+                ))
+
+            try:
+                totals = self.ledger.forecast(today, until.get().strip())
+
+            except ValueError:
+                projection.set("Enter the projection end date as YYYY-MM-DD")
+                return
+            balance = totals['income'] + totals['bonus'] - totals['expense']
+            projection.set(f"Income ₹{totals['income'] + totals['bonus']:.2f}, expenses ₹{totals['expense']:.2f}, balance ₹{balance:.2f}")
+
+        def add_rule():
+
+            try:
+                self.ledger.add_rule(
+                    source_of(rule_type.get()), amount.get().strip(), category.get(), frequency.get(),
+                    start.get().strip(), interval=interval.get()
+                )
+
+            except RuleError as e:
+                messagebox.showerror("Invalid Rule", str(e), parent=top)
+                return
+
+            if self.ledger.materialize_recurring():
+                self.show_history()
+            amount.delete(0, tk.END)
+            refresh()
+
+        def remove_rules():
+            for rule_id in table.selection():
+                self.ledger.remove_rule(rule_id)
+            refresh()
+
+        buttons = ttk.Frame(top)
+        buttons.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(buttons, text="Add Rule", command=add_rule).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Remove Selected", command=remove_rules).pack(side=tk.LEFT, padx=5)
+        ttk.Label(buttons, text="Project from today to").pack(side=tk.LEFT, padx=(20, 5))
+        until = ttk.Entry(buttons, width=11)
+        until.insert(0, (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d"))
+        until.pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Project", command=refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Label(top, textvariable=projection).pack(fill=tk.X, padx=10, pady=(0, 10))
+        refresh()
+
+    def write_perf_log(self):
+        atomic_write(os.path.join(self.data_dir, "perf.log"), lambda f: f.write(perf.report()))
+
+    def show_diagnostics(self, event=None):
+        """Hidden performance panel (Ctrl+Shift+D): counts, p50/p95/max and bytes written per operation"""
+        top = tk.Toplevel(self.root)
+        top.title("Diagnostics")
+        top.geometry("820x360")
+        status = tk.StringVar()
+        text = tk.Text(top, font=('Courier', 10), wrap=tk.NONE)
+
+        def refresh():
+            text.config(state=tk.NORMAL)
+            text.delete('1.0', tk.END)
+            text.insert(tk.END, perf.report() if perf.enabled else "Timing is off. Enable it with timing = true under [Diagnostics] in config.ini or FINANCE_TRACKER_TIMING=1.\n")
+            text.config(state=tk.DISABLED)
+
+        def save():
+            self.io_worker.submit('perf', self.write_perf_log)
+            status.set(f"Saved to {os.path.join(self.data_dir, 'perf.log')}")
+
+        buttons = ttk.Frame(top)
+        buttons.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Save Log", command=save).pack(side=tk.LEFT, padx=5)
+        ttk.Label(buttons, textvariable=status).pack(side=tk.LEFT, padx=5)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        refresh()
+
     def show_context_menu(self, event):
         """Show context menu on right-click"""
         item = self.history_tree.identify_row(event.y)
@@ -386,72 +972,55 @@ class FinanceTracker:
             })
         self.perform_deletion(transactions_to_delete)
 
+    @perf.timed('perform_deletion')
     def perform_deletion(self, transactions):
         """Perform deletion and store in undo stack"""
-        deleted_transactions = []
-        for trans in transactions:
-            trans_id = trans['id']
-            trans_type = trans['type']
-            trans_date = trans['date']
-
-            if trans_type == "Expense" and trans_date in self.expense_data:
-                for i, t in enumerate(self.expense_data[trans_date]):
-
-                    if t.get('id') == trans_id:
-                        deleted_trans = self.expense_data[trans_date].pop(i)
-                        deleted_trans['date'] = trans_date
-                        deleted_trans['source'] = 'expense'
-                        deleted_trans['index'] = i
-                        deleted_transactions.append(deleted_trans)
-                        break
-            elif trans_type == "Income" and trans_date in self.income_data:
-                for i, t in enumerate(self.income_data[trans_date]):
-
-                    if t.get('id') == trans_id:
-                        deleted_trans = self.income_data[trans_date].pop(i)
-                        deleted_trans['date'] = trans_date
-                        deleted_trans['source'] = 'income'
-                        deleted_trans['index'] = i
-                        deleted_transactions.append(deleted_trans)
-                        break
+        deleted_transactions = self.ledger.delete(
+            (trans['id'], source_of(trans['type']), trans['date']) for trans in transactions
+        )
 
         if deleted_transactions:
-            self.save_data(self.expense_data, self.expense_file)
-            self.save_data(self.income_data, self.income_file)
-            self.undo_stack.append(deleted_transactions)
-            self.update_display()
 
-    def undo_delete(self, event=None):
+            if self.search_matches is not None:
+                self.show_history()
+                return
+
+            if self.history.remove_rows([t['id'] for t in deleted_transactions]) < len(deleted_transactions):
+                self.update_display()
+            self.refresh_totals()
 
-        if not self.undo_stack:
+    def apply_changes(self, changes):
+        """Patch the history view with (change, source, date, trans) tuples from undo/redo"""
+
+        if self.search_matches is not None:
+            self.show_history()
             return
-        transactions = self.undo_stack.pop()
-        for trans in transactions:
-            trans_date = trans['date']
-            source = trans.pop('source', 'expense')
-            original_index = trans.pop('index', None)
-
-            if source == 'expense':
-
-                if trans_date not in self.expense_data:
-                    self.expense_data[trans_date] = []
-
-                if original_index is not None and original_index <= len(self.expense_data[trans_date]):
-                    self.expense_data[trans_date].insert(original_index, trans)
-                else:
-                    self.expense_data[trans_date].append(trans)
-            elif source == 'income':
-
-                if trans_date not in self.income_data:
-                    self.income_data[trans_date] = []
-
-                if original_index is not None and original_index <= len(self.income_data[trans_date]):
-                    self.income_data[trans_date].insert(original_index, trans)
-                else:
-                    self.income_data[trans_date].append(trans)
-        self.save_data(self.expense_data, self.expense_file)
-        self.save_data(self.income_data, self.income_file)
-        self.update_display()
+        start, end = self.displayed_range()
+        range_mode = bool(self.range_start_date and self.range_end_date)
+        for change, source, trans_date, trans in changes:
+
+            if change != 'add':
+                self.history.remove_rows([trans['id']])
+
+            if change != 'delete' and start <= trans_date <= end:
+                self.history.insert_row(self.history_row(source, trans_date, trans, range_mode))
+        self.refresh_totals()
+
+    @perf.timed('undo_change')
+    def undo_change(self, event=None):
+        """Undo the last add, edit or delete (Ctrl+Z)"""
+        changes = self.ledger.undo()
+
+        if changes:
+            self.apply_changes(changes)
+
+    @perf.timed('redo_change')
+    def redo_change(self, event=None):
+        """Redo the last undone change (Ctrl+Y)"""
+        changes = self.ledger.redo()
+
+        if changes:
+            self.apply_changes(changes)
 
     def customize_selected(self):
         """Customize selected transaction"""
@@ -474,26 +1043,18 @@ class FinanceTracker:
             trans_time = values[1]
         else:
             trans_time = values[0]
+        entry = self.ledger.locate(trans_id, source_of(trans_type), trans_date)
         transaction = None
         data_source = None
 
-        if trans_type == "Expense" and trans_date in self.expense_data:
-            for t in self.expense_data[trans_date]:
-
-                if t.get('id') == trans_id:
-                    transaction = t
-                    data_source = self.expense_data
-                    break
-        elif trans_type == "Income" and trans_date in self.income_data:
-            for t in self.income_data[trans_date]:
-
-                if t.get('id') == trans_id:
-                    transaction = t
-                    data_source = self.income_data
-                    break
+        if entry is not None:
+            source, trans_date, position = entry
+            data_source = self.datasets[source]
+            transaction = data_source[trans_date][position]
 
         if not transaction:
             return
+        self.pending_edit = (trans_id, source, trans_date, dict(transaction))
         self.open_customization_window(transaction, data_source, trans_date)
 
     def open_customization_window(self, transaction, data_source, date):
@@ -0,0 +1,137 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+BUCKETS_MS = (1, 5, 20, 100, 500)
+
+
+class OperationStats:
+    """Call count, total bytes and a rolling window of durations for one operation"""
+
+    def __init__(self, window):
+        self.count = 0
+        self.bytes = 0
+        self.durations = deque(maxlen=window)
+
+    def percentile(self, q):
+
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def histogram(self):
+        """Counts of recent durations per bucket: <1, <5, <20, <100, <500 and >=500 ms"""
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for ms in self.durations:
+            counts[next((i for i, bound in enumerate(BUCKETS_MS) if ms < bound), len(BUCKETS_MS))] += 1
+        return counts
+
+
+class Instrumentation:
+    """Opt-in timing of hot paths
+
+    Disabled by default, in which case measure() hands back a shared no-op
+    context manager. Enabled with FINANCE_TRACKER_TIMING=1 or
+    timing = true under [Diagnostics] in config.ini. Safe to record from the
+    I/O worker thread.
+    """
+
+    def __init__(self, window=1000):
+        self.enabled = os.environ.get("FINANCE_TRACKER_TIMING", "") not in ("", "0")
+        self.window = window
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.noop = nullcontext()
+
+    def operation(self, name):
+        stats = self.stats.get(name)
+
+        if stats is None:
+            stats = self.stats.setdefault(name, OperationStats(self.window))
+        return stats
+
+    def record(self, name, ms):
+
+        with self.lock:
+            stats = self.operation(name)
+            stats.count += 1
+            stats.durations.append(ms)
+
+    def add_bytes(self, name, count):
+
+        if self.enabled:
+
+            with self.lock:
+                self.operation(name).bytes += count
+
+    def measure(self, name):
+        """Context manager timing the enclosed block under name"""
+
+        if not self.enabled:
+            return self.noop
+        return Measurement(self, name)
+
+    def timed(self, name):
+        """Decorator timing every call of a function under name"""
+
+        def decorate(func):
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                with Measurement(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def summary(self):
+        """{name: {count, p50_ms, p95_ms, max_ms, bytes, histogram}} sorted by name"""
+
+        with self.lock:
+            return {
+                name: {
+                    'count': stats.count,
+                    'p50_ms': round(stats.percentile(0.50), 3),
+                    'p95_ms': round(stats.percentile(0.95), 3),
+                    'max_ms': round(max(stats.durations, default=0.0), 3),
+                    'bytes': stats.bytes,
+                    'histogram': stats.histogram()
+                }
+                for name, stats in sorted(self.stats.items())
+            }
+
+    def report(self):
+        """Plain-text table of summary()"""
+        labels = [f"<{bound}" for bound in BUCKETS_MS] + [f">={BUCKETS_MS[-1]}"]
+        lines = [f"{'operation':<24} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'bytes':>12}  histogram ms ({' '.join(labels)})"]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name:<24} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['max_ms']:>9.2f} {stats['bytes']:>12}  {' '.join(str(n) for n in stats['histogram'])}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Measurement:
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.record(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+perf = Instrumentation()
@@ -0,0 +1,225 @@
+import json
+import uuid
+from calendar import monthrange
+from datetime import date as date_type, timedelta
+from filelock import file_signature
+from safe_io import atomic_write, read_json
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'custom')
+OCCURRENCE_NAMESPACE = uuid.UUID('6f1f4f8e-1d0c-4c55-9d35-3b9a8f0a2c71')
+
+
+class RuleError(ValueError):
+    pass
+
+
+def parse_day(value):
+    return value if isinstance(value, date_type) else date_type.fromisoformat(value)
+
+
+def step_days(rule):
+    """Days between occurrences, or None for monthly rules"""
+
+    if rule['frequency'] == 'monthly':
+        return None
+    return rule['interval'] * (7 if rule['frequency'] == 'weekly' else 1)
+
+
+def occurrence(rule, n):
+    """Date of the nth occurrence (n = 0 is the start date)
+
+    Monthly rules keep the start's day of month, moved back to the last day
+    in shorter months.
+    """
+    start = parse_day(rule['start'])
+    step = step_days(rule)
+
+    if step is not None:
+        return start + timedelta(days=n * step)
+    months = start.month - 1 + n * rule['interval']
+    year, month = start.year + months // 12, months % 12 + 1
+    return date_type(year, month, min(start.day, monthrange(year, month)[1]))
+
+
+def first_index(rule, day):
+    """Smallest n whose occurrence falls on or after day"""
+    start = parse_day(rule['start'])
+    step = step_days(rule)
+
+    if step is not None:
+        n = max(0, -(-(day - start).days // step))
+    else:
+        n = max(0, ((day.year - start.year) * 12 + day.month - start.month) // rule['interval'])
+        while n > 0 and occurrence(rule, n - 1) >= day:
+            n -= 1
+        while occurrence(rule, n) < day:
+            n += 1
+    return n
+
+
+def index_range(rule, start, end):
+    """(first, last) occurrence numbers between start and end inclusive, within the rule's own bounds
+
+    Computed arithmetically, so a range of any length costs the same.
+    """
+    start = max(parse_day(start), parse_day(rule['start']))
+    end = parse_day(end)
+
+    if rule.get('end'):
+        end = min(end, parse_day(rule['end']))
+    return first_index(rule, start), first_index(rule, end + timedelta(days=1)) - 1
+
+
+def occurrences(rule, start, end):
+    """Yield each 'YYYY-MM-DD' occurrence between start and end inclusive"""
+    first, last = index_range(rule, start, end)
+    for n in range(first, last + 1):
+        yield occurrence(rule, n).isoformat()
+
+
+def occurrence_id(rule, day):
+    """Transaction id for one occurrence, the same in every process that materializes it"""
+    return str(uuid.uuid5(OCCURRENCE_NAMESPACE, f"{rule['id']}/{day}"))
+
+
+def describe(rule):
+    """'every 2 weeks' style summary of a rule's frequency"""
+    unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month', 'custom': 'day'}[rule['frequency']]
+    return f"every {unit}" if rule['interval'] == 1 else f"every {rule['interval']} {unit}s"
+
+
+class RecurringRules:
+    """Recurring transaction rules, kept in recurring.json next to the data files
+
+    A rule is a dict with id, source, amount, category, optional bonus, note
+    and time, frequency (daily, weekly, monthly or custom - every interval
+    days), interval, start, optional end, and last: the date up to which
+    its occurrences have been added to the ledger.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rules = []
+        self.signature = None
+        self.reload()
+
+    def reload(self):
+        """Re-read the file if another process has changed it"""
+        signature = file_signature(self.path)
+
+        if signature == self.signature:
+            return
+        self.signature = signature
+
+        try:
+            self.rules = read_json(self.path).get('rules', [])
+
+        except (OSError, ValueError):
+            self.rules = []
+
+    def state(self):
+        """Copy of the rules for writing on another thread"""
+        return {'rules': [dict(rule) for rule in self.rules]}
+
+    def write(self, state):
+        atomic_write(self.path, lambda f: json.dump(state, f, indent=4))
+        self.signature = file_signature(self.path)
+
+    def add(self, source, amount, category, frequency, start, interval=1, end=None, time=None, bonus=None, note=None):
+        """Validate and store a new rule; returns it"""
+
+        if source not in ('expense', 'income'):
+            raise RuleError(f"unknown type {source!r}")
+
+        if frequency not in FREQUENCIES:
+            raise RuleError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+
+        try:
+            interval = int(interval)
+            amount = float(amount)
+            start = parse_day(start).isoformat()
+            end = parse_day(end).isoformat() if end else None
+
+        except (TypeError, ValueError) as e:
+            raise RuleError(str(e))
+
+        if interval < 1:
+            raise RuleError("interval must be at least 1")
+
+        if end is not None and end < start:
+            raise RuleError("end date is before the start date")
+        rule = {
+            'id': str(uuid.uuid4()),
+            'source': source,
+            'amount': amount,
+            'category': category,
+            'frequency': frequency,
+            'interval': interval,
+            'start': start,
+            'end': end,
+            'last': None
+        }
+
+        if time:
+            rule['time'] = time
+
+        if source == 'income':
+            rule['bonus'] = float(bonus or 0)
+
+        if note:
+            rule['note'] = note
+        self.rules.append(rule)
+        return rule
+
+    def remove(self, rule_id):
+        """Drop a rule; transactions it already added stay"""
+        kept = [rule for rule in self.rules if rule['id'] != rule_id]
+        removed = len(kept) < len(self.rules)
+        self.rules = kept
+        return removed
+
+    def get(self, rule_id):
+        return next((rule for rule in self.rules if rule['id'] == rule_id), None)
+
+    def due(self, today):
+        """[(rule, date)] for occurrences up to today that have not been added yet"""
+        due = []
+        for rule in self.rules:
+            after = parse_day(rule['last']) + timedelta(days=1) if rule.get('last') else rule['start']
+            due.extend((rule, day) for day in occurrences(rule, after, today))
+        return due
+
+    def mark_materialized(self, today):
+        """Record that every occurrence up to today has been added; returns True if any rule changed"""
+        changed = False
+        for rule in self.rules:
+
+            if rule['start'] <= today and (rule.get('last') or '') < today:
+                rule['last'] = today
+                changed = True
+        return changed
+
+    def next_occurrence(self, rule, today):
+        """'YYYY-MM-DD' of the first occurrence after today, or None when the rule has ended"""
+        after = max(parse_day(today) + timedelta(days=1), parse_day(rule['start']))
+        day = occurrence(rule, first_index(rule, after)).isoformat()
+        return None if rule.get('end') and day > rule['end'] else day
+
+    def forecast(self, start, end):
+        """Income, expense and bonus the rules will add between start and end, counting without materializing"""
+        totals = {'income': 0.0, 'expense': 0.0, 'bonus': 0.0}
+        for rule in self.rules:
+            after = parse_day(start)
+
+            if rule.get('last'):
+                after = max(after, parse_day(rule['last']) + timedelta(days=1))
+
+            if after > parse_day(end):
+                continue
+            first, last = index_range(rule, after, end)
+            count = max(0, last - first + 1)
+            totals[rule['source']] += count * rule['amount']
+
+            if rule['source'] == 'income':
+                totals['bonus'] += count * float(rule.get('bonus') or 0)
+        return totals
@@ -0,0 +1,270 @@
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date as date_type, timedelta
+from transaction import id_key
+
+WORD = re.compile(r"\w+")
+AMOUNT = re.compile(r"^(>=|<=|>|<|=)?(\d+(?:\.\d+)?)(?:-(\d+(?:\.\d+)?))?$")
+COMPARISON_SPACE = re.compile(r"([<>]=?|=)\s*₹?\s*")
+PERIODS = re.compile(r"\b(this|last)\s+(year|month)\b|\btoday\b", re.IGNORECASE)
+TYPE_WORDS = {'expense': 'expense', 'expenses': 'expense', 'income': 'income', 'incomes': 'income'}
+
+
+def period_range(text, today):
+    """(start, end) for 'today', 'this/last month' or 'this/last year'"""
+    text = text.lower().split()
+
+    if text == ['today']:
+        return today.isoformat(), today.isoformat()
+    which, unit = text
+
+    if unit == 'year':
+        year = today.year - (which == 'last')
+        return f"{year}-01-01", f"{year}-12-31"
+    first = today.replace(day=1)
+
+    if which == 'last':
+        first = (first - timedelta(days=1)).replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first.isoformat(), (following - timedelta(days=1)).isoformat()
+
+
+def parse_query(text, categories=(), today=None):
+    """Turn search bar text into a query dict
+
+    Understands type:expense or a bare expense/income, category:Food or a
+    bare category name, amounts as >500, <=1000, =250 or 100-500 (a ₹ sign
+    and spaces after the operator are allowed), from:/to: dates, year:2024,
+    month:2024-06, and the phrases today, this month, last month, this year
+    and last year. Every other word must appear in the note, matching word
+    prefixes so results can follow typing.
+    """
+    today = today or date_type.today()
+    known = {name.lower(): name for name in categories}
+    query = {'source': None, 'categories': set(), 'low': None, 'high': None, 'start': None, 'end': None, 'words': []}
+    text = COMPARISON_SPACE.sub(lambda m: m.group(1), text.replace('₹', ' '))
+    period = PERIODS.search(text)
+
+    if period:
+        query['start'], query['end'] = period_range(period.group(0), today)
+        text = text[:period.start()] + text[period.end():]
+    for token in text.split():
+        key, _, value = token.partition(':')
+        key = key.lower()
+        amount = AMOUNT.match(token)
+
+        if value and key == 'type' and value.lower() in TYPE_WORDS:
+            query['source'] = TYPE_WORDS[value.lower()]
+        elif value and key in ('category', 'cat'):
+            query['categories'].add(value.lower())
+        elif value and key in ('from', 'to', 'year', 'month'):
+            set_dates(query, key, value)
+        elif token.lower() in TYPE_WORDS:
+            query['source'] = TYPE_WORDS[token.lower()]
+        elif token.lower() in known:
+            query['categories'].add(token.lower())
+        elif amount and (amount.group(1) or amount.group(3)):
+            set_amounts(query, *amount.groups())
+        else:
+            query['words'].extend(word.lower() for word in WORD.findall(token))
+    return query
+
+
+def set_dates(query, key, value):
+
+    if key == 'year':
+        query['start'], query['end'] = f"{value}-01-01", f"{value}-12-31"
+    elif key == 'month':
+        first = date_type.fromisoformat(f"{value}-01")
+        following = (first + timedelta(days=32)).replace(day=1)
+        query['start'], query['end'] = first.isoformat(), (following - timedelta(days=1)).isoformat()
+    else:
+        query['start' if key == 'from' else 'end'] = date_type.fromisoformat(value).isoformat()
+
+
+def set_amounts(query, operator, first, second):
+    """Amount bounds are (value, inclusive) pairs"""
+    first = float(first)
+
+    if second is not None:
+        query['low'], query['high'] = (first, True), (float(second), True)
+    elif operator in ('>', '>='):
+        query['low'] = (first, operator == '>=')
+    elif operator in ('<', '<='):
+        query['high'] = (first, operator == '<=')
+    else:
+        query['low'] = query['high'] = (first, True)
+
+
+def amount_of(trans):
+    return float(trans.get('amount') or 0)
+
+
+class SearchIndex:
+    """Inverted index over every transaction for whole-history search
+
+    terms maps ('type', source), ('category', name) and ('word', note word)
+    to the set of id keys carrying it, and amounts / amount_keys are parallel
+    lists kept sorted by amount. Both are updated per transaction as it is
+    added or removed, so nothing is rescanned between searches.
+    """
+
+    def __init__(self):
+        self.terms = {}
+        self.amounts = []
+        self.amount_keys = []
+        self.vocabulary = None
+
+    @staticmethod
+    def entries(source, trans):
+        yield 'type', source
+        yield 'category', str(trans.get('category') or '').lower()
+        for word in set(WORD.findall(str(trans.get('note') or '').lower())):
+            yield 'word', word
+
+    def build(self, datasets):
+        """Index every transaction of every {source: {date: [transactions]}}"""
+        self.terms = {}
+        amounts = []
+        for source, data in datasets.items():
+            for transactions in data.values():
+                for trans in transactions:
+                    key = id_key(trans)
+                    for term in self.entries(source, trans):
+                        self.terms.setdefault(term, set()).add(key)
+                    amounts.append((amount_of(trans), key))
+        amounts.sort(key=lambda pair: pair[0])
+        self.amounts = [amount for amount, key in amounts]
+        self.amount_keys = [key for amount, key in amounts]
+        self.vocabulary = None
+
+    def add(self, source, trans):
+        key = id_key(trans)
+        for term in self.entries(source, trans):
+
+            if term[0] == 'word' and term not in self.terms:
+                self.vocabulary = None
+            self.terms.setdefault(term, set()).add(key)
+        amount = amount_of(trans)
+        i = bisect_right(self.amounts, amount)
+        self.amounts.insert(i, amount)
+        self.amount_keys.insert(i, key)
+
+    def remove(self, source, trans):
+        """Drop a transaction; trans must still hold the values it was added with
+
+        A term left with no keys is deleted, so adding it back later marks
+        the vocabulary for rebuilding.
+        """
+        key = id_key(trans)
+        for term in self.entries(source, trans):
+            keys = self.terms.get(term)
+
+            if keys is not None:
+                keys.discard(key)
+
+                if not keys:
+                    del self.terms[term]
+        amount = amount_of(trans)
+        for i in range(bisect_left(self.amounts, amount), bisect_right(self.amounts, amount)):
+
+            if self.amount_keys[i] == key:
+                del self.amounts[i]
+                del self.amount_keys[i]
+                break
+
+    def category_names(self):
+        return [term[1] for term, keys in self.terms.items() if term[0] == 'category' and keys]
+
+    def words_with_prefix(self, prefix):
+        """Indexed note words starting with prefix, from a sorted vocabulary rebuilt only after new words appear"""
+
+        if self.vocabulary is None:
+            self.vocabulary = sorted(term[1] for term, keys in self.terms.items() if term[0] == 'word' and keys)
+        start = bisect_left(self.vocabulary, prefix)
+        end = bisect_left(self.vocabulary, prefix + '\uffff')
+        return self.vocabulary[start:end]
+
+    def amount_slice(self, low, high):
+        """(start, end) positions in the sorted amounts within the (value, inclusive) bounds"""
+        start, end = 0, len(self.amounts)
+
+        if low is not None:
+            start = (bisect_left if low[1] else bisect_right)(self.amounts, low[0])
+
+        if high is not None:
+            end = (bisect_right if high[1] else bisect_left)(self.amounts, high[0])
+        return start, max(start, end)
+
+    def candidates(self, query):
+        """Sets of keys, one per type, category or note word condition, that every match must be in"""
+        sets = []
+
+        if query['source']:
+            sets.append(self.terms.get(('type', query['source']), set()))
+
+        if query['categories']:
+            sets.append(set().union(*(self.terms.get(('category', name), set()) for name in query['categories'])))
+        for word in query['words']:
+            sets.append(set().union(*(self.terms.get(('word', match), set()) for match in self.words_with_prefix(word))))
+        return sets
+
+    def search(self, query, resolve):
+        """[(source, date, trans)] matching a parsed query, ordered by date and time
+
+        The term sets are intersected smallest first. The amount range joins
+        the intersection when its slice is small enough to be worth turning
+        into a set, and is otherwise checked on each resolved transaction
+        along with the date range. resolve(key) returns (source, date,
+        trans) or None. Returns None when the query has no indexed condition.
+        """
+        sets = sorted(self.candidates(query), key=len)
+        low, high = query['low'], query['high']
+        ranged = low is not None or high is not None
+        check_amount = False
+
+        if ranged:
+            start, end = self.amount_slice(low, high)
+
+            if not sets or end - start <= 4 * len(sets[0]):
+                sets.insert(0, set(self.amount_keys[start:end]))
+            else:
+                check_amount = True
+
+        if not sets:
+            return None
+        keys = sets[0].intersection(*sets[1:])
+        matches = []
+        for key in keys:
+            found = resolve(key)
+
+            if found is None:
+                continue
+            source, date, trans = found
+
+            if query['start'] and date < query['start'] or query['end'] and date > query['end']:
+                continue
+
+            if check_amount and not in_range(amount_of(trans), low, high):
+                continue
+            matches.append(found)
+        matches.sort(key=lambda found: (found[1], found[2].get('time', '')))
+        return matches
+
+
+def in_range(amount, low, high):
+
+    if low is not None and (amount < low[0] or amount == low[0] and not low[1]):
+        return False
+    return high is None or amount < high[0] or amount == high[0] and high[1]
+
+
+def match_totals(matches):
+    """Income, expense and bonus totals of [(source, date, trans)] search results"""
+    totals = {'income': 0.0, 'expense': 0.0, 'bonus': 0.0}
+    for source, date, trans in matches:
+        totals[source] += amount_of(trans)
+
+        if source == 'income':
+            totals['bonus'] += float(trans.get('bonus') or 0)
+    return totals
@@ -0,0 +1,787 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from filelock import DataLock, file_signature
+from journal import TransactionJournal
+from safe_io import atomic_write, atomic_write_json, load_json_with_recovery
+from transaction import as_dict
+from columnar import LazyMonthDict, encode_month, list_months, month_path, months_between, read_month_file, split_months
+
+SOURCES = ('expense', 'income')
+COLUMNS = ('id', 'time', 'category', 'amount', 'bonus')
+
+
+def merge_days(ours, theirs):
+    """Union by id of two {date: [transactions]}: ours unchanged plus whatever only theirs has"""
+    ids = {t.get('id') for transactions in ours.values() for t in transactions}
+    merged = {date: list(transactions) for date, transactions in ours.items()}
+    for date, transactions in theirs.items():
+        missing = [t for t in transactions if t.get('id') not in ids]
+
+        if missing:
+            merged.setdefault(date, []).extend(missing)
+    return merged
+
+
+def assign_missing_ids(data):
+    """Give every transaction in {date: [transactions]} without an id a fresh UUID, in place
+
+    Returns the set of dates where ids were assigned.
+    """
+    dates = set()
+    for date, transactions in data.items():
+        for trans in transactions:
+
+            if trans.get('id') is None:
+                trans['id'] = str(uuid.uuid4())
+                dates.add(date)
+    return dates
+
+
+class JsonStorage:
+    """expenses.json / income.json snapshots with an append-only journal
+
+    Safe to share between processes: every file access happens under the
+    data directory lock, and the signature of each snapshot as last read or
+    written tells changes() which ones another process has rewritten.
+    """
+    lazy = False
+
+    def __init__(self, data_dir):
+        self.files = {
+            'expense': os.path.join(data_dir, "expenses.json"),
+            'income': os.path.join(data_dir, "income.json")
+        }
+        self.backup_dir = os.path.join(data_dir, "backups")
+        self.lock = DataLock(os.path.join(data_dir, "data.lock"))
+        self.journal = TransactionJournal(os.path.join(data_dir, "journal.jsonl"), lock=self.lock)
+        self.datasets = None
+        self.signatures = {}
+        self.stale = set()
+        self.recovered = []
+
+    def has_data(self):
+        paths = list(self.files.values()) + [self.journal.path, self.journal.compacting_path]
+        return any(os.path.exists(path) for path in paths)
+
+    def read_json(self, filename):
+        """Read one snapshot file, falling back to the newest valid backup if it is corrupt"""
+
+        with self.lock:
+            data, recovered_from = load_json_with_recovery(filename, self.backup_dir)
+            self.signatures[filename] = file_signature(filename)
+
+        if recovered_from:
+            self.recovered.append((filename, recovered_from))
+        return data
+
+    def load(self, source):
+        """Return the {date: [transactions]} dict for a source"""
+
+        if self.datasets is None:
+
+            with self.lock:
+                self.datasets = {s: self.read_json(self.files[s]) for s in SOURCES}
+                self.journal.replay(self.datasets['expense'], self.datasets['income'])
+        return self.datasets[source]
+
+    def changes(self):
+        """(records, reloaded) that other processes wrote since the last call
+
+        records are journal entries to apply to memory; reloaded lists
+        (source, None, days) for snapshots rewritten elsewhere, read afresh
+        with the journal replayed on top. Costs a few stat calls when
+        nothing has changed.
+        """
+
+        if self.datasets is None:
+            return [], []
+
+        with self.lock:
+            records, replaced = self.journal.take_changes()
+            stale = {
+                s for s in SOURCES
+                if replaced or s in self.stale or file_signature(self.files[s]) != self.signatures.get(self.files[s])
+            }
+            self.stale = set()
+
+            if not stale:
+                return records, []
+            fresh = {s: self.read_json(self.files[s]) for s in stale}
+            self.journal.replay_into(fresh)
+        return [r for r in records if r.get('source') not in stale], [(s, None, fresh[s]) for s in SOURCES if s in stale]
+
+    def has_changes(self):
+        """Whether changes() may find anything, from stat calls alone so it is cheap enough for the Tk thread"""
+
+        if self.datasets is None:
+            return False
+        return (
+            bool(self.stale) or file_signature(self.journal.path) != self.journal.signature
+            or any(file_signature(path) != self.signatures.get(path) for path in self.files.values())
+        )
+
+    def mark_stale(self, reloaded):
+        """Have the next changes() read the sources of reloaded entries afresh again"""
+        self.stale.update(source for source, month, days in reloaded)
+
+    def load_range(self, source, start_date, end_date):
+        data = self.load(source)
+        return {date: trans for date, trans in data.items() if start_date <= date <= end_date}
+
+    def write_snapshot(self, data, filename):
+        """Write a full JSON snapshot atomically, rotating the previous one into backups
+
+        If another process rewrote the file since this one read it, the two
+        are merged by id first so neither side's transactions are lost. The
+        journal is replayed onto the file's copy before merging so deletions
+        made elsewhere are not brought back.
+        """
+
+        with self.lock:
+
+            if filename in self.signatures and file_signature(filename) != self.signatures[filename]:
+                sources = [s for s, path in self.files.items() if path == filename]
+                theirs = {s: load_json_with_recovery(filename, self.backup_dir)[0] for s in sources}
+                for record in self.journal.records():
+                    self.journal.apply(record, theirs)
+                for s in sources:
+                    data = merge_days(data, theirs[s])
+                self.stale.update(sources)
+            atomic_write_json(data, filename, self.backup_dir)
+            self.signatures[filename] = file_signature(filename)
+
+    def save(self, source, data):
+        """Rewrite the full snapshot for a source"""
+        self.journal.wait()
+        self.write_snapshot(data, self.files[source])
+
+    def detach(self, source, data):
+        """Copy data so it can be written off the main thread"""
+        return {date: [as_dict(t) for t in trans] for date, trans in data.items()}
+
+    def record(self, op, source, date, trans, index=None):
+        """Journal a single mutation"""
+        self.journal.append(op, source, date, trans, index)
+
+    def record_many(self, records):
+        """Journal a batch of (op, source, date, trans, index) mutations in one write"""
+        self.journal.append_many(records)
+
+    def needs_compaction(self):
+        return self.datasets is not None and self.journal.needs_compaction()
+
+    def snapshot(self):
+        """Copy the live datasets so they can be written off the main thread"""
+        return [
+            ({date: [as_dict(t) for t in trans] for date, trans in self.datasets[s].items()}, self.files[s])
+            for s in SOURCES
+        ]
+
+    def checkpoint(self):
+        return self.journal.checkpoint()
+
+    def compact(self, snapshots, checkpoint):
+        """Fold the journal into the snapshot files"""
+        self.journal.compact(snapshots, self.write_snapshot, checkpoint)
+
+    def close(self):
+        self.journal.wait()
+
+
+class SqliteStorage:
+    """Single finance.db with one row per transaction, indexed by date, type, category and id
+
+    Lazy like the columnar backend: a month is read with one indexed range
+    query the first time one of its days is touched, so startup costs the
+    same however many years are stored.
+    """
+    lazy = True
+
+    def __init__(self, data_dir):
+        self.db_file = os.path.join(data_dir, "finance.db")
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.stale = False
+        self.recovered = []
+        self.loaded = {s: set() for s in SOURCES}
+        self.datasets = {s: LazyMonthDict(self, s) for s in SOURCES}
+        self.listeners = []
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS transactions (
+                id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                date TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                time TEXT,
+                category TEXT,
+                amount REAL,
+                bonus REAL,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date, position);
+            CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions (source, date);
+            CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category, date);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.seen_version = self.data_version()
+
+    @staticmethod
+    def to_row(source, date, position, trans):
+        extra = {k: v for k, v in trans.items() if k not in COLUMNS}
+        return (
+            trans['id'], source, date, position,
+            trans.get('time'), trans.get('category'), trans.get('amount'), trans.get('bonus'),
+            json.dumps(extra) if extra else None
+        )
+
+    @staticmethod
+    def from_row(row):
+        trans_id, time, category, amount, bonus, extra = row
+        trans = {'id': trans_id, 'time': time, 'category': category, 'amount': amount}
+
+        if bonus is not None:
+            trans['bonus'] = bonus
+
+        if extra:
+            trans.update(json.loads(extra))
+        return trans
+
+    def query(self, source, where="", params=()):
+        data = {}
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT date, id, time, category, amount, bonus, extra FROM transactions "
+                f"WHERE source = ? {where} ORDER BY date, position",
+                (source,) + tuple(params)
+            ).fetchall()
+        for row in rows:
+            data.setdefault(row[0], []).append(self.from_row(row[1:]))
+        return data
+
+    def data_version(self):
+        """Counter SQLite bumps whenever another connection commits"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def query_months(self, source, months):
+        """{month: {date: [transactions]}} for the given months, read with one range query"""
+        months = sorted(months)
+        found = {month: {} for month in months}
+
+        if months:
+            data = self.query(source, "AND date BETWEEN ? AND ?", (f"{months[0]}-01", f"{months[-1]}-31"))
+            for date, transactions in data.items():
+
+                if date[:7] in found:
+                    found[date[:7]][date] = transactions
+        return found
+
+    def stored_months(self, source):
+        """Every month with rows for a source, from the (source, date) index"""
+
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT substr(date, 1, 7) FROM transactions WHERE source = ?", (source,)
+            ).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def load_months(self, source, months):
+        """Read the months not yet in memory and hand them to the listeners"""
+        months = set(months) - self.loaded[source]
+
+        if not months:
+            return
+        self.loaded[source].update(months)
+        days = {}
+        for month_days in self.query_months(source, months).values():
+            days.update(month_days)
+        self.datasets[source].days.update(days)
+        for listener in self.listeners:
+            listener(source, days)
+
+    def ensure_month(self, source, month):
+        self.load_months(source, [month])
+
+    def ensure_all(self, source):
+        self.load_months(source, self.stored_months(source))
+
+    def add_month_listener(self, listener):
+        """Call listener(source, days) for every month loaded so far and from now on"""
+        self.listeners.append(listener)
+        for source in SOURCES:
+            listener(source, dict(self.datasets[source].loaded_items()))
+
+    def load(self, source):
+        """Return the lazy {date: [transactions]} mapping for a source"""
+        return self.datasets[source]
+
+    def changes(self):
+        """([], reloaded) with every loaded month re-read if another process committed since the last call
+
+        SQLite does its own locking, so all that is needed is one PRAGMA to
+        notice foreign commits. The version is noted before reading, so a
+        commit landing mid-read only causes one more reload later. Months
+        not in memory are read fresh when first touched.
+        """
+
+        with self.lock:
+            version = self.data_version()
+
+        if version == self.seen_version and not self.stale:
+            return [], []
+        self.seen_version = version
+        self.stale = False
+        reloaded = []
+        for source in SOURCES:
+            fresh = self.query_months(source, list(self.loaded[source]))
+            reloaded.extend((source, month, days) for month, days in fresh.items())
+        return [], reloaded
+
+    def has_changes(self):
+        """Whether changes() may find anything; never waits, answering True while the connection is busy"""
+
+        if self.stale:
+            return True
+
+        if not self.lock.acquire(blocking=False):
+            return True
+
+        try:
+            return self.data_version() != self.seen_version
+
+        finally:
+            self.lock.release()
+
+    def mark_stale(self, reloaded):
+        self.stale = True
+
+    def load_range(self, source, start_date, end_date):
+        """Load the months covering start_date..end_date and return the days between them"""
+        self.load_months(source, months_between(start_date, end_date))
+        return {date: trans for date, trans in self.datasets[source].loaded_items() if start_date <= date <= end_date}
+
+    def detach(self, source, data):
+        """Copy only the months in memory; rows of other months stay as they are"""
+        return {date: [as_dict(t) for t in trans] for date, trans in self.datasets[source].loaded_items()}
+
+    def save(self, source, data):
+        """Replace the stored rows of every month present in data
+
+        If another process has committed since this one last read, rows
+        only it has are kept instead, merging the two by id.
+        """
+        self.replace_months(source, split_months(data))
+
+    def write_month(self, days, key):
+        source, month = key
+        self.replace_months(source, {month: days})
+
+    def replace_months(self, source, months):
+        rows = [
+            self.to_row(source, date, position, trans)
+            for days in months.values()
+            for date, transactions in days.items()
+            for position, trans in enumerate(transactions)
+        ]
+
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+
+            if self.data_version() == self.seen_version:
+                self.conn.executemany(
+                    "DELETE FROM transactions WHERE source = ? AND date BETWEEN ? AND ?",
+                    [(source, f"{month}-01", f"{month}-31") for month in months]
+                )
+            else:
+                self.stale = True
+            self.conn.executemany("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def record(self, op, source, date, trans, index=None):
+        """Apply a single add/delete/edit as one small transaction"""
+        self.record_many([(op, source, date, trans, index)])
+
+    def record_many(self, records):
+        """Apply a batch of (op, source, date, trans, index) mutations in one transaction"""
+
+        with self.lock, self.conn:
+            for op, source, date, trans, index in records:
+                self.apply(op, source, date, trans, index)
+
+    def apply(self, op, source, date, trans, index=None):
+
+        if op == "add":
+            self.insert(source, date, trans, index)
+        elif op == "delete":
+            self.conn.execute("DELETE FROM transactions WHERE id = ?", (trans['id'],))
+        elif op == "edit":
+            row = self.conn.execute("SELECT position FROM transactions WHERE id = ?", (trans['id'],)).fetchone()
+
+            if row is None:
+                self.insert(source, date, trans, index)
+            else:
+                self.conn.execute(
+                    "REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self.to_row(source, date, row[0], trans)
+                )
+
+    def insert(self, source, date, trans, index=None):
+        """Insert at the index-th slot of the day, or append when index is None"""
+        position = None
+
+        if index is not None:
+            row = self.conn.execute(
+                "SELECT position FROM transactions WHERE source = ? AND date = ? "
+                "ORDER BY position LIMIT 1 OFFSET ?",
+                (source, date, index)
+            ).fetchone()
+
+            if row is not None:
+                position = row[0]
+                self.conn.execute(
+                    "UPDATE transactions SET position = position + 1 "
+                    "WHERE source = ? AND date = ? AND position >= ?",
+                    (source, date, position)
+                )
+
+        if position is None:
+            row = self.conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM transactions WHERE source = ? AND date = ?",
+                (source, date)
+            ).fetchone()
+            position = row[0]
+        self.conn.execute(
+            "INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            self.to_row(source, date, position, trans)
+        )
+
+    def needs_compaction(self):
+        return False
+
+    def is_migrated(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        return row is not None
+
+    def export_json(self, json_storage):
+        """Write every stored row back out as expenses.json / income.json, replacing their journal"""
+        for source in SOURCES:
+            json_storage.write_snapshot(self.query(source), json_storage.files[source])
+        json_storage.journal.clear()
+
+    def migrate_from(self, json_storage):
+        """Replace the database contents with the JSON snapshots and journal"""
+
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM transactions")
+
+        if json_storage.has_data():
+            for source in SOURCES:
+                data = json_storage.load(source)
+                assign_missing_ids(data)
+                self.save(source, data)
+
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', '1')")
+
+    def close(self):
+        self.conn.close()
+
+
+class ColumnarStorage:
+    """Month-partitioned binary files under months/<source>/, read only when a month is touched
+
+    Mutations are journaled like the JSON backend; compaction rewrites only
+    the months that have been loaded, since nothing else can have changed.
+    """
+    lazy = True
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.month_dir = os.path.join(data_dir, "months")
+        os.makedirs(self.month_dir, exist_ok=True)
+        self.lock = DataLock(os.path.join(data_dir, "data.lock"))
+        self.journal = TransactionJournal(os.path.join(self.month_dir, "journal.jsonl"), lock=self.lock)
+        self.folders = {s: file_signature(os.path.join(self.month_dir, s)) for s in SOURCES}
+        self.available = {s: set(list_months(self.month_dir, s)) for s in SOURCES}
+        self.loaded = {s: set() for s in SOURCES}
+        self.datasets = {s: LazyMonthDict(self, s) for s in SOURCES}
+        self.signatures = {}
+        self.stale = set()
+        self.listeners = []
+        self.replayed = False
+        self.recovered = []
+
+    def ensure_month(self, source, month):
+        """Read a month file into memory the first time it is needed"""
+
+        if month in self.loaded[source]:
+            return
+        self.loaded[source].add(month)
+        path = month_path(self.month_dir, source, month)
+
+        with self.lock:
+            self.signatures[path] = file_signature(path)
+
+            if month not in self.available[source]:
+                return
+            days = read_month_file(self.month_dir, source, month)
+        self.datasets[source].days.update(days)
+        for listener in self.listeners:
+            listener(source, days)
+
+    def ensure_all(self, source):
+        for month in sorted(self.available[source]):
+            self.ensure_month(source, month)
+
+    def add_month_listener(self, listener):
+        """Call listener(source, days) for every month loaded so far and from now on"""
+        self.listeners.append(listener)
+        for source in SOURCES:
+            listener(source, dict(self.datasets[source].loaded_items()))
+
+    def load(self, source):
+        """Return the lazy {date: [transactions]} mapping for a source"""
+
+        if not self.replayed:
+            self.replayed = True
+
+            with self.lock:
+                self.journal.replay(self.datasets['expense'], self.datasets['income'])
+        return self.datasets[source]
+
+    def changes(self):
+        """(records, reloaded) that other processes wrote since the last call
+
+        Like JsonStorage.changes(), but reloaded holds (source, month, days)
+        for loaded months whose file was rewritten elsewhere. Months not in
+        memory are left alone; they are read fresh when first touched.
+        """
+
+        with self.lock:
+            records, replaced = self.journal.take_changes()
+            self.folders = {s: file_signature(os.path.join(self.month_dir, s)) for s in SOURCES}
+            self.available = {s: set(list_months(self.month_dir, s)) for s in SOURCES}
+            stale = {
+                (s, month) for s in SOURCES for month in list(self.loaded[s])
+                if replaced or (s, month) in self.stale
+                or file_signature(month_path(self.month_dir, s, month)) != self.signatures.get(month_path(self.month_dir, s, month))
+            }
+            self.stale = set()
+
+            if not stale:
+                return records, []
+            fresh = {}
+            for source, month in stale:
+                path = month_path(self.month_dir, source, month)
+                self.signatures[path] = file_signature(path)
+                fresh[(source, month)] = read_month_file(self.month_dir, source, month) if month in self.available[source] else {}
+            journal = self.journal.all_records()
+        for record in journal:
+            key = (record.get('source'), record.get('date', '')[:7])
+
+            if key in fresh:
+                self.journal.apply(record, {key[0]: fresh[key]})
+            elif replaced:
+                records.append(record)
+        records = [r for r in records if (r.get('source'), r.get('date', '')[:7]) not in fresh]
+        return records, [(source, month, days) for (source, month), days in sorted(fresh.items())]
+
+    def has_changes(self):
+        """Whether changes() may find anything, from stat calls alone so it is cheap enough for the Tk thread
+
+        The month folders are checked too, since a month file created
+        elsewhere must join available even before it is loaded here.
+        """
+
+        if self.stale or file_signature(self.journal.path) != self.journal.signature:
+            return True
+        for source in SOURCES:
+
+            if file_signature(os.path.join(self.month_dir, source)) != self.folders[source]:
+                return True
+            for month in list(self.loaded[source]):
+                path = month_path(self.month_dir, source, month)
+
+                if file_signature(path) != self.signatures.get(path):
+                    return True
+        return False
+
+    def mark_stale(self, reloaded):
+        """Have the next changes() read the months of reloaded entries afresh again"""
+        self.stale.update((source, month) for source, month, days in reloaded)
+
+    def load_range(self, source, start_date, end_date):
+        data = self.load(source)
+        for month in sorted(self.available[source]):
+
+            if start_date[:7] <= month <= end_date[:7]:
+                self.ensure_month(source, month)
+        return {date: trans for date, trans in data.loaded_items() if start_date <= date <= end_date}
+
+    def detach(self, source, data):
+        """Copy only the months in memory; unloaded months are unchanged on disk"""
+        return {date: [as_dict(t) for t in trans] for date, trans in self.datasets[source].loaded_items()}
+
+    def write_month(self, days, key):
+        """Rewrite one month file, merging by id with another process's rewrite of it"""
+        source, month = key
+        path = month_path(self.month_dir, source, month)
+        assign_missing_ids(days)
+
+        with self.lock:
+
+            if path in self.signatures and file_signature(path) != self.signatures[path]:
+
+                if os.path.exists(path):
+                    theirs = read_month_file(self.month_dir, source, month)
+                    for record in self.journal.records():
+
+                        if record.get('date', '')[:7] == month:
+                            self.journal.apply(record, {source: theirs})
+                    days = merge_days(days, theirs)
+                self.stale.add(key)
+
+            if not any(days.values()):
+
+                if os.path.exists(path):
+                    os.remove(path)
+                self.available[source].discard(month)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                blob = encode_month(days)
+                atomic_write(path, lambda f: f.write(blob), binary=True)
+                self.available[source].add(month)
+            self.signatures[path] = file_signature(path)
+
+    def save(self, source, data):
+        """Rewrite every month present in data"""
+        self.journal.wait()
+        for month, days in split_months(data).items():
+            self.write_month(days, (source, month))
+
+    def record(self, op, source, date, trans, index=None):
+        """Journal a single mutation"""
+        self.journal.append(op, source, date, trans, index)
+
+    def record_many(self, records):
+        """Journal a batch of (op, source, date, trans, index) mutations in one write"""
+        self.journal.append_many(records)
+
+    def needs_compaction(self):
+        return self.journal.needs_compaction()
+
+    def snapshot(self):
+        """Copy the loaded months so they can be written off the main thread"""
+        snapshots = []
+        for source in SOURCES:
+            months = {month: {} for month in self.loaded[source]}
+            for date, trans in self.datasets[source].loaded_items():
+                months.setdefault(date[:7], {})[date] = [as_dict(t) for t in trans]
+            snapshots.extend((days, (source, month)) for month, days in months.items())
+        return snapshots
+
+    def checkpoint(self):
+        return self.journal.checkpoint()
+
+    def compact(self, snapshots, checkpoint):
+        self.journal.compact(snapshots, self.write_month, checkpoint)
+
+    def export_json(self, json_storage):
+        """Write every month back out as expenses.json / income.json, replacing their journal"""
+        for source in SOURCES:
+            self.load(source)
+            self.ensure_all(source)
+            json_storage.write_snapshot(self.detach(source, None), json_storage.files[source])
+        json_storage.journal.clear()
+
+    def migrate_from(self, json_storage):
+        """Replace the month files and their journal with the JSON snapshots and journal"""
+        self.journal.clear()
+
+        with self.lock:
+            for source in SOURCES:
+                for month in list_months(self.month_dir, source):
+                    os.remove(month_path(self.month_dir, source, month))
+            self.available = {s: set() for s in SOURCES}
+
+        if json_storage.has_data():
+            for source in SOURCES:
+                data = json_storage.load(source)
+                assign_missing_ids(data)
+                self.save(source, data)
+
+        with open(os.path.join(self.month_dir, ".migrated"), 'w') as f:
+            f.write("1")
+
+    def close(self):
+        self.journal.wait()
+
+
+BACKENDS = {'json': JsonStorage, 'sqlite': SqliteStorage, 'columnar': ColumnarStorage}
+
+
+def active_backend(data_dir, requested):
+    """Backend the data currently lives in, as recorded in the backend file
+
+    Data directories from before it was recorded are judged by the
+    migration markers; when several exist the one last written wins.
+    """
+    path = os.path.join(data_dir, "backend")
+
+    if os.path.exists(path):
+
+        with open(path, 'r') as f:
+            return f.read().strip()
+    found = {}
+    marker = os.path.join(data_dir, "months", ".migrated")
+
+    if os.path.exists(marker):
+        found['columnar'] = os.path.getmtime(marker)
+    db_file = os.path.join(data_dir, "finance.db")
+
+    if os.path.exists(db_file):
+        storage = SqliteStorage(data_dir)
+
+        if storage.is_migrated():
+            found['sqlite'] = os.path.getmtime(db_file)
+        storage.close()
+
+    if requested in found:
+        return requested
+    return max(found, key=found.get) if found else "json"
+
+
+def open_storage(data_dir, backend="json"):
+    """Create the configured storage backend, converting the data when the backend has changed
+
+    Data kept in another backend is first exported back to the JSON files,
+    then migrated from them into the new one, so switching in either
+    direction never shows a stale copy. An unknown backend name falls back
+    to json.
+    """
+
+    if backend not in BACKENDS:
+        print(f"Unknown storage backend {backend!r} in config.ini, using json")
+        backend = "json"
+    backend_file = os.path.join(data_dir, "backend")
+
+    with DataLock(os.path.join(data_dir, "backend.lock")):
+        previous = active_backend(data_dir, backend)
+
+        if previous != backend:
+
+            if previous in BACKENDS and previous != "json":
+                old = BACKENDS[previous](data_dir)
+                old.export_json(JsonStorage(data_dir))
+                old.close()
+
+            if backend != "json":
+                new = BACKENDS[backend](data_dir)
+                new.migrate_from(JsonStorage(data_dir))
+                new.close()
+
+        if previous != backend or not os.path.exists(backend_file):
+            atomic_write(backend_file, lambda f: f.write(backend))
+    return BACKENDS[backend](data_dir)
@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import Ledger
+
+
+class EditPersistenceTest(unittest.TestCase):
+    """Edits made in place by the customization window must survive a restart"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def customize(self, ledger, trans_id, amount):
+        source, date, position = ledger.locate(trans_id)
+        trans = ledger.datasets[source][date][position]
+        before = dict(trans)
+        trans['amount'] = amount
+        ledger.note_edit(trans_id, source, date, before)
+        ledger.save('expense')
+        ledger.save('income')
+
+    def test_edit_undo_redo_edit_survives_restart(self):
+        for backend in ('json', 'columnar', 'sqlite'):
+
+            with self.subTest(backend=backend):
+                data_dir = os.path.join(self.data_dir, backend)
+                ledger = Ledger(data_dir, backend)
+                trans = ledger.add('expense', 100, 'Food', '2024-01-01', '10:00:00')
+                self.customize(ledger, trans['id'], 200)
+                ledger.undo()
+                ledger.redo()
+                self.customize(ledger, trans['id'], 300)
+                self.assertEqual(ledger.get(trans['id'])['amount'], 300)
+                ledger.close()
+                ledger = Ledger(data_dir, backend)
+                self.assertEqual(ledger.get(trans['id'], 'expense', '2024-01-01')['amount'], 300)
+                ledger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+from datetime import datetime
+from safe_io import atomic_write
+
+
+def process_start():
+    """perf_counter() value at process start, read from /proc where it exists
+
+    Elsewhere this falls back to the moment this module is imported, which
+    is why main.py imports it first.
+    """
+    now = time.perf_counter()
+
+    try:
+
+        with open("/proc/self/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+
+        with open("/proc/uptime", 'r') as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+
+    except (OSError, ValueError, IndexError, AttributeError):
+        return now
+    return now - max(0.0, uptime - started)
+
+
+PROCESS_START = process_start()
+
+
+class StartupTimer:
+    """Milliseconds from process start to each named startup milestone"""
+
+    def __init__(self):
+        self.marks = {}
+
+    def mark(self, name):
+
+        if name not in self.marks:
+            self.marks[name] = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+
+    def entry(self):
+        """This launch as one JSON line"""
+        return json.dumps({'at': datetime.now().isoformat(timespec='seconds'), 'ms': dict(self.marks)})
+
+    def write(self, path, entry, keep=200):
+        """Append an entry to a JSON Lines log, keeping the last keep launches"""
+
+        try:
+
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()[-(keep - 1):]
+
+        except OSError:
+            lines = []
+        atomic_write(path, lambda f: f.write("\n".join(lines + [entry]) + "\n"))
@@ -0,0 +1,278 @@
+import math
+import sys
+import threading
+from collections.abc import MutableMapping
+
+MISSING = object()
+KEYS = ('id', 'time', 'category', 'amount', 'bonus', 'note')
+KEY_SET = frozenset(KEYS)
+CATEGORY_NAMES = []
+CATEGORY_CODES = {}
+category_lock = threading.Lock()
+
+AMOUNT_FLOAT = 1
+AMOUNT_RAW = 2
+BONUS_FLOAT = 4
+BONUS_RAW = 8
+ID_RAW = 16
+
+
+def category_code(name):
+    """Small integer standing for a category name, shared by every transaction"""
+    code = CATEGORY_CODES.get(name)
+
+    if code is None:
+
+        with category_lock:
+            code = CATEGORY_CODES.get(name)
+
+            if code is None:
+                code = len(CATEGORY_NAMES)
+                CATEGORY_NAMES.append(name)
+                CATEGORY_CODES[name] = code
+    return code
+
+
+def compact_id(trans_id):
+    """128-bit int for a canonical UUID string, anything else unchanged"""
+
+    if isinstance(trans_id, str) and len(trans_id) == 36:
+
+        try:
+            value = int(trans_id.replace('-', ''), 16)
+
+        except ValueError:
+            return trans_id
+
+        if format_id(value) == trans_id:
+            return value
+    return trans_id
+
+
+def id_key(trans):
+    """Index key for a Transaction or plain dict without formatting the id as a string"""
+
+    if isinstance(trans, Transaction):
+        return trans.trans_id
+    return compact_id(trans.get('id'))
+
+
+def format_id(value):
+    digits = f"{value:032x}"
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+def to_paise(value, float_flag, raw_flag):
+    """(stored value, flag bits) for an amount: exact integer paise for int/float amounts, else the raw value
+
+    float_flag marks a float to be restored on the way out; raw_flag marks a
+    value that could not be represented exactly in paise and is kept as is.
+    """
+    value_type = type(value)
+
+    if value_type is int:
+        return value * 100, 0
+
+    if value_type is float and math.isfinite(value):
+        paise = round(value * 100)
+
+        if paise / 100 == value:
+            return paise, float_flag
+    return value, raw_flag
+
+
+def from_paise(stored, flags, float_flag, raw_flag):
+
+    if stored is MISSING or flags & raw_flag:
+        return stored
+    return stored / 100 if flags & float_flag else stored // 100
+
+
+class Transaction(MutableMapping):
+    """One transaction in a fixed set of slots instead of a dict
+
+    Amount and bonus are held as integer paise, a UUID id as a 128-bit int and
+    the category as a shared code. It behaves as a mapping with the same keys
+    and values as the dict it was built from, and dict(trans) converts it back
+    losslessly for JSON. Keys beyond the standard ones go in extra.
+    """
+
+    __slots__ = ('trans_id', 'time', 'category', 'paise', 'bonus_paise', 'note', 'flags', 'extra')
+
+    def __init__(self, fields=None, **kwargs):
+        self.trans_id = self.time = self.category = self.paise = self.bonus_paise = self.note = MISSING
+        self.flags = 0
+        self.extra = None
+        for source in (fields or {}, kwargs):
+            for key, value in source.items():
+                self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from a loaded dict in one pass, setting slots directly"""
+
+        if isinstance(data, cls):
+            return data
+        trans = cls.__new__(cls)
+        trans.flags = 0
+        trans.extra = None
+        trans_id = data.get('id', MISSING)
+        trans.trans_id = compact_id(trans_id)
+
+        if trans.trans_id is trans_id and trans_id is not MISSING:
+            trans.flags = ID_RAW
+        time = data.get('time', MISSING)
+        trans.time = sys.intern(time) if isinstance(time, str) else time
+        category = data.get('category', MISSING)
+        trans.category = category if category is MISSING else category_code(category)
+        trans.paise = trans.bonus_paise = MISSING
+
+        if 'amount' in data:
+            trans.paise, bits = to_paise(data['amount'], AMOUNT_FLOAT, AMOUNT_RAW)
+            trans.flags |= bits
+
+        if 'bonus' in data:
+            trans.bonus_paise, bits = to_paise(data['bonus'], BONUS_FLOAT, BONUS_RAW)
+            trans.flags |= bits
+        trans.note = data.get('note', MISSING)
+
+        if not KEY_SET.issuperset(data):
+            trans.extra = {key: value for key, value in data.items() if key not in KEY_SET}
+        return trans
+
+    def to_dict(self):
+        """Plain dict with the original keys and value types, ready for JSON"""
+        data = {}
+
+        if self.trans_id is not MISSING:
+            data['id'] = self.trans_id if self.flags & ID_RAW else format_id(self.trans_id)
+
+        if self.time is not MISSING:
+            data['time'] = self.time
+
+        if self.category is not MISSING:
+            data['category'] = CATEGORY_NAMES[self.category]
+
+        if self.paise is not MISSING:
+            data['amount'] = from_paise(self.paise, self.flags, AMOUNT_FLOAT, AMOUNT_RAW)
+
+        if self.bonus_paise is not MISSING:
+            data['bonus'] = from_paise(self.bonus_paise, self.flags, BONUS_FLOAT, BONUS_RAW)
+
+        if self.note is not MISSING:
+            data['note'] = self.note
+
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __getitem__(self, key):
+
+        if key == 'id':
+            value = self.trans_id
+
+            if value is not MISSING and not self.flags & ID_RAW:
+                value = format_id(value)
+        elif key == 'time':
+            value = self.time
+        elif key == 'category':
+            value = self.category if self.category is MISSING else CATEGORY_NAMES[self.category]
+        elif key == 'amount':
+            value = from_paise(self.paise, self.flags, AMOUNT_FLOAT, AMOUNT_RAW)
+        elif key == 'bonus':
+            value = from_paise(self.bonus_paise, self.flags, BONUS_FLOAT, BONUS_RAW)
+        elif key == 'note':
+            value = self.note
+        else:
+            value = MISSING if self.extra is None else self.extra.get(key, MISSING)
+
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+
+        if key == 'id':
+            stored = compact_id(value)
+            self.trans_id = stored
+            self.flags = self.flags | ID_RAW if stored is value else self.flags & ~ID_RAW
+        elif key == 'time':
+            self.time = sys.intern(value) if isinstance(value, str) else value
+        elif key == 'category':
+            self.category = category_code(value)
+        elif key == 'amount':
+            self.paise, bits = to_paise(value, AMOUNT_FLOAT, AMOUNT_RAW)
+            self.flags = (self.flags & ~(AMOUNT_FLOAT | AMOUNT_RAW)) | bits
+        elif key == 'bonus':
+            self.bonus_paise, bits = to_paise(value, BONUS_FLOAT, BONUS_RAW)
+            self.flags = (self.flags & ~(BONUS_FLOAT | BONUS_RAW)) | bits
+        elif key == 'note':
+            self.note = value
+        else:
+
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+
+        if key not in self:
+            raise KeyError(key)
+
+        if key == 'id':
+            self.trans_id = MISSING
+        elif key == 'time':
+            self.time = MISSING
+        elif key == 'category':
+            self.category = MISSING
+        elif key == 'amount':
+            self.paise = MISSING
+        elif key == 'bonus':
+            self.bonus_paise = MISSING
+        elif key == 'note':
+            self.note = MISSING
+        else:
+            del self.extra[key]
+
+            if not self.extra:
+                self.extra = None
+
+    def __contains__(self, key):
+
+        try:
+            self[key]
+
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        stored = (self.trans_id, self.time, self.category, self.paise, self.bonus_paise, self.note)
+        for key, value in zip(KEYS, stored):
+
+            if value is not MISSING:
+                yield key
+
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Transaction({self.to_dict()!r})"
+
+    def copy(self):
+        return Transaction(self)
+
+
+def as_dict(trans):
+    """Plain dict copy of a Transaction or of a dict"""
+    return trans.to_dict() if isinstance(trans, Transaction) else dict(trans)
+
+
+def compact_days(days):
+    """Replace the dicts in {date: [transactions]} with Transactions, in place"""
+    for transactions in days.values():
+        transactions[:] = [Transaction.from_dict(t) for t in transactions]
+    return days
@@ -0,0 +1,199 @@
+import json
+import os
+from collections import deque
+from safe_io import atomic_write, read_json
+
+COMPACT_BYTES = 64 * 1024
+REWRITE_SLACK = 64 * 1024
+
+
+def measure(command):
+    return len(json.dumps(command, separators=(',', ':')))
+
+
+def compacted(command):
+    """An add too large to keep whole becomes just its ids per day: enough to undo, not to redo"""
+    days = {}
+    for source, date, trans, index in command['items']:
+        days.setdefault((source, date), []).append(trans['id'])
+    return {'op': 'add_ids', 'days': [[source, date, ids] for (source, date), ids in days.items()]}
+
+
+class UndoLog:
+    """Bounded undo/redo history of ledger commands, kept in an append-only file
+
+    A command is {'op': 'add' | 'delete' | 'edit', 'items': [...]} holding
+    only what is needed to reverse and replay it: [source, date, trans, index]
+    for adds and deletes, [id, source, date, before, after] with just the
+    changed fields for edits. An add over COMPACT_BYTES (an import or a
+    recurring run) is stored as an 'add_ids' command instead, which can be
+    undone but not redone.
+
+    Each change appends one event line - {"push": command}, {"undo": 1},
+    {"redo": 1} or {"clear": 1} - and loading replays them. Once the file
+    has grown well past the commands still live it is rewritten as a single
+    {"state": ...} line. The stacks keep at most depth commands and
+    max_bytes of JSON between them, evicting the oldest first, so memory
+    and file size stay flat over long sessions.
+    """
+
+    def __init__(self, path, depth=100, max_bytes=4 * 1024 * 1024):
+        self.path = path
+        self.legacy_path = os.path.splitext(path)[0] + ".json"
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.undo = deque()
+        self.redo = deque()
+        self.size = 0
+        self.events = []
+        self.written = 0
+        self.legacy = False
+        self.load()
+
+    def load(self):
+
+        if os.path.exists(self.path):
+
+            with open(self.path, 'r') as f:
+                for line in f:
+                    self.written += len(line)
+
+                    try:
+                        self.apply(json.loads(line))
+
+                    except (ValueError, KeyError, TypeError, IndexError):
+                        continue
+            return
+
+        if not os.path.exists(self.legacy_path):
+            return
+
+        try:
+            state = read_json(self.legacy_path)
+
+        except (OSError, ValueError):
+            return
+        self.apply({'state': state})
+        self.legacy = True
+
+    def apply(self, event, size=None):
+        """Change the stacks as event describes; returns the command moved by an undo or redo"""
+
+        if 'push' in event:
+            self.redo_clear()
+            size = size or measure(event['push'])
+
+            if size > self.max_bytes:
+                self.undo_clear()
+                return None
+            self.undo.append((event['push'], size))
+            self.size += size
+        elif 'undo' in event:
+            command, size = self.undo.pop()
+            self.size -= size
+
+            if command['op'] == 'add_ids':
+                self.redo_clear()
+            else:
+                self.redo.append((command, size))
+                self.size += size
+            return command
+        elif 'redo' in event:
+            command, size = self.redo.pop()
+            self.undo.append((command, size))
+            return command
+        elif 'clear' in event:
+            self.undo_clear()
+            self.redo_clear()
+        elif 'state' in event:
+            self.undo_clear()
+            self.redo_clear()
+            for name in ('undo', 'redo'):
+                for command in event['state'].get(name, []):
+                    size = measure(command)
+                    getattr(self, name).append((command, size))
+                    self.size += size
+        self.evict()
+        return None
+
+    def evict(self):
+        while len(self.undo) > self.depth or self.undo and self.size > self.max_bytes:
+            self.size -= self.undo.popleft()[1]
+        while len(self.redo) > self.depth or self.redo and self.size > self.max_bytes:
+            self.size -= self.redo.popleft()[1]
+
+    def undo_clear(self):
+        self.size -= sum(size for command, size in self.undo)
+        self.undo.clear()
+
+    def redo_clear(self):
+        self.size -= sum(size for command, size in self.redo)
+        self.redo.clear()
+
+    def record(self, event, size=0):
+        result = self.apply(event, size)
+        self.events.append(event)
+        self.written += size + 12
+        return result
+
+    def push(self, command):
+        """Record a new command; a fresh change invalidates anything that could be redone
+
+        A command over max_bytes even when compacted clears the history instead.
+        """
+        size = measure(command)
+
+        if command['op'] == 'add' and size > COMPACT_BYTES:
+            command = compacted(command)
+            size = measure(command)
+
+        if size > self.max_bytes:
+            self.record({'clear': 1})
+        else:
+            self.record({'push': command}, size)
+
+    def pop_undo(self):
+        """Take the command to reverse, moving it onto the redo stack"""
+        return self.record({'undo': 1})
+
+    def pop_redo(self):
+        """Take the command to replay, moving it back onto the undo stack"""
+        return self.record({'redo': 1})
+
+    def needs_rewrite(self):
+        return self.legacy or self.written > 2 * self.size + REWRITE_SLACK
+
+    def take_events(self):
+        """Events recorded since the last call, for append() on another thread"""
+        events, self.events = self.events, []
+        return events
+
+    def append(self, events):
+
+        if not events:
+            return
+
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(event, separators=(',', ':')) + "\n" for event in events)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def state(self):
+        """Copy of both stacks for write() on another thread; pending events become redundant"""
+        self.events = []
+        self.written = self.size
+        self.legacy = False
+        return {'undo': [command for command, size in self.undo], 'redo': [command for command, size in self.redo]}
+
+    def write(self, state):
+        """Replace the file with one line holding state"""
+        atomic_write(self.path, lambda f: f.write(json.dumps({'state': state}, separators=(',', ':')) + "\n"))
+
+        if os.path.exists(self.legacy_path):
+            os.remove(self.legacy_path)
+
+    def can_undo(self):
+        return bool(self.undo)
+
+    def can_redo(self):
+        return bool(self.redo)